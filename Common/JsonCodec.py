@@ -0,0 +1,111 @@
+import json
+import threading
+"""
+JsonCodec decodes responses and encodes request bodies for the HuaweiFusionSolar
+and TuyaCloud clients.
+
+The fastest installed library is used by default (default_codec): orjson, then
+simdjson, then the standard library json module.
+
+loads(content, keys) returns only the given top level keys. JsonCodec and
+OrjsonCodec still decode the whole document; only SimdjsonCodec skips the
+conversion of the other subtrees to Python objects.
+"""
+
+################################################################################
+# Optional JSON libraries
+################################################################################
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+class JsonCodec(object):
+    """
+    Standard library json codec.
+    """
+    name = "json"
+
+    def _decode(self, content):
+        return json.loads(content)
+
+
+    def loads(self, content, keys=None):
+        """
+        Decode content. If keys is given, only these top level keys are
+        returned (missing keys are None); the whole document is decoded anyway.
+        """
+        obj = self._decode(content)
+        if keys is None:
+            return obj
+
+        return { key : obj.get(key) for key in keys }
+
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    orjson codec.
+    """
+    name = "orjson"
+
+    def _decode(self, content):
+        return orjson.loads(content)
+
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode('UTF-8')
+
+
+class SimdjsonCodec(JsonCodec):
+    """
+    simdjson codec. The document is parsed lazily and, when keys are given,
+    only these subtrees are converted to Python objects.
+    """
+    name = "simdjson"
+
+    def __init__(self):
+        # Parsers are not thread safe, use one per thread
+        self.local = threading.local()
+
+
+    def loads(self, content, keys=None):
+        parser = getattr(self.local, 'parser', None)
+        if parser is None:
+            parser = self.local.parser = simdjson.Parser()
+
+        doc = parser.parse(content)
+        if keys is None:
+            return self.__convert(doc)
+
+        return { key : self.__convert(doc.get(key)) for key in keys }
+
+
+    def __convert(self, value):
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+
+        return value
+
+
+def default_codec():
+    """
+    Return the fastest installed codec.
+    """
+    if orjson is not None:
+        return OrjsonCodec()
+    if simdjson is not None:
+        return SimdjsonCodec()
+
+    return JsonCodec()
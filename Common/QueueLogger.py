@@ -0,0 +1,126 @@
+import os
+import queue
+import atexit
+import logging
+import itertools
+import threading
+
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+"""
+QueueLogger is the process wide logging of the HuaweiFusionSolar and TuyaCloud
+clients.
+
+Log records are put on a queue and written to file by a background listener,
+so requests never wait for disk I/O or message formatting. There is a single
+queue handler per log file in the process, shared by all clients logging to
+that file.
+"""
+
+################################################################################
+# Logger config.
+################################################################################
+LOGGER_LOG_LEVEL = logging.DEBUG    # Default logging level
+LOGGER_FILE_SIZE = 10000000         # 10 MB
+LOGGER_FILE_BACKUP = 5              # Number of backup files
+LOGGER_BODY_MAX = 2048              # Logged body size limit (None: no limit, 0: off)
+LOGGER_SINK_PREFIX = "iot.sink:"    # Process wide per file logger name prefix
+
+_logger_lock = threading.Lock()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Queue handler leaving message formatting to the listener thread.
+    """
+    def prepare(self, record):
+        return record
+
+
+class LogBody(object):
+    """
+    Request/response body formatted (and truncated) only when written.
+    """
+    def __init__(self, body):
+        self.body = body
+
+
+    def __str__(self):
+        body = self.body
+        if isinstance(body, bytes):
+            body = body.decode('UTF-8', errors='replace')
+        else:
+            body = str(body)
+
+        if LOGGER_BODY_MAX is not None and len(body) > LOGGER_BODY_MAX:
+            return "%s...(%d bytes)" % (body[:LOGGER_BODY_MAX], len(body))
+
+        return body
+
+
+def get_logger(log_file, name):
+    """
+    Return the logger called name, writing to log_file through the process
+    wide queue handler of that file (created on first use).
+
+    Parameters:
+        log_file        : Filename to be used for logging
+        name            : Logger name (module of the client)
+    """
+    path = os.path.abspath(log_file)
+
+    with _logger_lock:
+        sink = logging.getLogger(LOGGER_SINK_PREFIX + path)
+        if not sink.handlers:
+            # Create a rotating file handler
+            file_handler = RotatingFileHandler(
+                                        path,
+                                        maxBytes=LOGGER_FILE_SIZE,
+                                        backupCount=LOGGER_FILE_BACKUP
+                                            )
+
+            # Set the desired log level and format
+            file_handler.setLevel(LOGGER_LOG_LEVEL)
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            file_handler.setFormatter(formatter)
+
+            # Write records from a background thread
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+
+            sink.addHandler(_DeferredQueueHandler(log_queue))
+            sink.propagate = False
+
+        handler = sink.handlers[0]
+
+        logger = logging.getLogger(name)
+        logger.setLevel(LOGGER_LOG_LEVEL)
+        if handler not in logger.handlers:
+            logger.addHandler(handler)
+
+        return logger
+
+
+def sampled(logger, rates, name, counters):
+    """
+    Check if the debug messages of a request for method name are logged.
+
+    Parameters:
+        logger          : Client logger (None if logging is off)
+        rates           : Dictionary with method name as key and N as value,
+                          to log 1 of N requests of high rate methods
+        name            : Method name
+        counters        : Dictionary keeping the request counters of the
+                          sampled methods (owned by the client)
+    """
+    if logger is None or not logger.isEnabledFor(logging.DEBUG):
+        return False
+
+    rate = rates.get(name)
+    if rate is None:
+        return True
+
+    counter = counters.setdefault(name, itertools.count())
+
+    return next(counter) % rate == 0
@@ -0,0 +1,178 @@
+import math
+import time
+"""
+AdaptivePoller schedules the real time reads of a HuaweiInverter consumer
+(ex: real_time_active_power) instead of polling at a fixed interval:
+
+    - Night             No polls between sunset and sunrise (plus a twilight
+                        margin). Sunrise and sunset are computed locally from
+                        the plant coordinates (NOAA sunrise equation).
+    - Near threshold    Poll every SmartPVMS refresh (5 minutes) while active
+                        power is within near_ratio of the trigger power.
+    - Far from it       Poll less often, up to max_interval, the further the
+                        active power is from the trigger power.
+
+SmartPVMS refreshes real time data every 5 minutes, so polling faster does not
+return new values; polls are aligned just after each refresh (offset) so every
+call returns the freshest data. Real time ResponseCache entries expire on the
+same refresh grid (multiples of interval since the epoch), so aligned polls are
+never served the previous value from the cache.
+"""
+
+################################################################################
+# Poller config. (seconds)
+################################################################################
+REFRESH_INTERVAL = 5 * 60           # SmartPVMS real time data refresh period
+REFRESH_OFFSET = 60                 # Delay after a refresh before polling
+MAX_INTERVAL = 15 * 60              # Longest interval between day polls
+NEAR_RATIO = 0.2                    # Relative distance to trigger polled fast
+TWILIGHT_MARGIN = 30 * 60           # Polls before sunrise/after sunset
+
+################################################################################
+# Sunrise equation constants
+################################################################################
+JULIAN_UNIX_EPOCH = 2440587.5       # Julian day of 1970-01-01 00:00 UTC
+JULIAN_2000 = 2451545.0             # Julian day of 2000-01-01 12:00 UTC
+SUN_ALTITUDE = -0.833               # Sun altitude (deg) at sunrise/sunset
+EARTH_TILT = 23.4397                # Earth axial tilt (deg)
+
+
+def sun_times(latitude, longitude, t):
+    """
+    Return (sunrise, sunset) in epoch seconds of the day of t (epoch seconds)
+    at the given coordinates (degrees, east positive).
+
+    Return (None, None) during polar night and (-inf, inf) during midnight sun.
+    """
+    sin = lambda deg: math.sin(math.radians(deg))
+    cos = lambda deg: math.cos(math.radians(deg))
+
+    # Mean solar time of the day of t
+    n = math.floor(t / 86400 + JULIAN_UNIX_EPOCH - JULIAN_2000 + 0.5 + longitude / 360)
+    j = n - longitude / 360
+
+    m = (357.5291 + 0.98560028 * j) % 360
+    c = 1.9148 * sin(m) + 0.0200 * sin(2 * m) + 0.0003 * sin(3 * m)
+    l = (m + c + 180 + 102.9372) % 360
+    transit = JULIAN_2000 + j + 0.0053 * sin(m) - 0.0069 * sin(2 * l)
+
+    sin_d = sin(l) * sin(EARTH_TILT)
+    cos_d = math.cos(math.asin(sin_d))
+    cos_w = (sin(SUN_ALTITUDE) - sin(latitude) * sin_d) / (cos(latitude) * cos_d)
+
+    if cos_w > 1:
+        return None, None
+    if cos_w < -1:
+        return -math.inf, math.inf
+
+    w = math.degrees(math.acos(cos_w))
+    to_epoch = lambda jd: (jd - JULIAN_UNIX_EPOCH) * 86400
+
+    return to_epoch(transit - w / 360), to_epoch(transit + w / 360)
+
+
+class AdaptivePoller(object):
+    def __init__(self, latitude, longitude, interval=REFRESH_INTERVAL, offset=REFRESH_OFFSET,
+                max_interval=MAX_INTERVAL, near_ratio=NEAR_RATIO, margin=TWILIGHT_MARGIN):
+        """
+        Create an adaptive poller.
+
+        Parameters:
+            latitude        : Plant latitude (degrees, north positive)
+            longitude       : Plant longitude (degrees, east positive)
+            interval        : SmartPVMS refresh period (seconds)
+            offset          : Delay after a refresh before polling (seconds)
+            max_interval    : Longest interval between day polls (seconds)
+            near_ratio      : Relative distance to the trigger polled fast
+            margin          : Polls before sunrise and after sunset (seconds)
+        """
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.interval = interval
+        self.offset = offset
+        self.max_interval = max(max_interval, interval)
+        self.near_ratio = near_ratio
+        self.margin = margin
+
+
+    @classmethod
+    def from_inverter(cls, inverter, **kwargs):
+        """
+        Create an adaptive poller with the coordinates of a HuaweiInverter
+        (from the device topology).
+        """
+        device = inverter.topology.device(inverter.device_id) or {}
+        if device.get('latitude') is None or device.get('longitude') is None:
+            raise ValueError("No coordinates for device %s!" % inverter.device_id)
+
+        return cls(device['latitude'], device['longitude'], **kwargs)
+
+
+    def sun_times(self, t=None):
+        """
+        Return (sunrise, sunset) in epoch seconds of the day of t (default now).
+        """
+        return sun_times(self.latitude, self.longitude, time.time() if t is None else t)
+
+
+    def is_daylight(self, t=None):
+        """
+        Return True if t (default now) is within the polling hours.
+        """
+        t = time.time() if t is None else t
+        sunrise, sunset = self.sun_times(t)
+        if sunrise is None:
+            return False
+
+        return sunrise - self.margin <= t <= sunset + self.margin
+
+
+    def __align(self, t):
+        """
+        Return the first poll time just after a refresh, not before t.
+        """
+        return math.ceil((t - self.offset) / self.interval) * self.interval + self.offset
+
+
+    def __next_day(self, now):
+        """
+        Return the start of the polling hours after now (searching up to a year
+        ahead for polar regions).
+        """
+        for day in range(367):
+            sunrise, sunset = self.sun_times(now + day * 86400)
+            if sunrise is not None and sunrise - self.margin > now:
+                return sunrise - self.margin
+            if sunrise is not None and now <= sunset + self.margin:
+                return now
+
+        return now + self.max_interval
+
+
+    def next_poll(self, active_power=None, trigger_power=None, now=None):
+        """
+        Return the time (epoch seconds) of the next poll given the last active
+        power read and the trigger power (both optional).
+        """
+        now = time.time() if now is None else now
+
+        if not self.is_daylight(now):
+            return self.__align(self.__next_day(now))
+
+        delay = self.interval
+        if active_power is not None and trigger_power is not None:
+            distance = abs(float(active_power) - float(trigger_power)) / max(abs(float(trigger_power)), 1e-3)
+            if distance > self.near_ratio:
+                delay = min(self.interval * math.ceil(distance / self.near_ratio), self.max_interval)
+
+        # Poll just after the first refresh at least delay after the last one
+        return self.__align(now + delay - self.interval + 1)
+
+
+    def delay(self, active_power=None, trigger_power=None, now=None):
+        """
+        Return the time (seconds) to wait before the next poll.
+        """
+        now = time.time() if now is None else now
+
+        return max(self.next_poll(active_power, trigger_power, now) - now, 0)
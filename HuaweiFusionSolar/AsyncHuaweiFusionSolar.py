@@ -0,0 +1,535 @@
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from QuotaScheduler import QuotaScheduler
+from HuaweiFusionSolar import RESPONSE_KEYS, JSON_HEADER, LOGIN_RETRIES, chunk_requests, merge_results, \
+                            request_header, relogin_delay, response_data, login_token, log_request
+from JsonCodec import default_codec
+from QueueLogger import get_logger
+"""
+AsyncHuaweiFusionSolar is the asyncio counterpart of HuaweiFusionSolar: the
+SmartPVMS endpoints as coroutines, so requests for many plants and device
+types run concurrently on one event loop.
+
+    - One pooled aiohttp session per client, with at most max_concurrency
+      requests in flight and a per request timeout.
+    - Single-flight xsrf-token renewal: concurrent requests rejected with an
+      expired token wait for one login and reuse its token.
+    - Quotas (QuotaScheduler) are enforced as by HuaweiFusionSolar; waiting for
+      a quota slot does not block the event loop.
+    - Id lists longer than ID_CHUNK_SIZE are split in chunks sent concurrently.
+
+Chunking, quota observation, re-login decisions and response checks are the
+HuaweiFusionSolar request helpers. The session and the login lock belong to the
+running event loop: they are recreated (and the previous session closed) when
+the client is used from another loop (ex: successive asyncio.run calls).
+
+Ex:
+    async with AsyncHuaweiFusionSolar(name, password, domain) as obj:
+        data = await obj.real_time_sweep({ 1 : string_ids, 38 : residential_ids })
+
+Requires aiohttp.
+"""
+
+################################################################################
+# Async transport config.
+################################################################################
+ASYNC_MAX_CONCURRENCY = 10          # Maximum requests in flight
+ASYNC_TIMEOUT = 30                  # Request timeout (seconds)
+
+
+class AsyncHuaweiFusionSolar(object):
+    def __init__(self, client_name=None, client_pass=None, client_domain=None, log_file=None,
+                max_concurrency=ASYNC_MAX_CONCURRENCY, timeout=ASYNC_TIMEOUT, quota=None,
+                json_codec=None):
+        """
+        Create an async Huawei SmartPVMS client (login is performed on first use
+        or by connect).
+
+        Parameters:
+            client_name     : Client username for SmartPVMS access.
+            client_pass     : Client password for SmartPVMS access.
+            client_domain   : Client domain name of the SmartPVMS system.
+            log_file        : Filename to be used for logging
+            max_concurrency : Maximum requests in flight.
+            timeout         : Request timeout (seconds).
+            quota           : QuotaScheduler enforcing the API call budgets
+                              (share it between clients of the same user).
+            json_codec      : JsonCodec used for requests and responses
+                              (default_codec() if None).
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncHuaweiFusionSolar requires aiohttp!")
+
+        self.logger = None
+        self.log_counters = {}
+        self.xsrf_token = None
+        self.relogin_count = 0
+        self.login_lock = None
+        self.login_loop = None
+        self.quota = quota if quota is not None else QuotaScheduler()
+        self.codec = json_codec if json_codec is not None else default_codec()
+
+        self.client_name = client_name
+        self.client_pass = client_pass
+        self.endpoint = f'https://{client_domain}'
+
+        # Pooled session (created in the running event loop on first use)
+        self.session = None
+        self.semaphore = None
+        self.session_loop = None
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+        # Configure logger (if given)
+        if log_file is not None:
+            self.logger = get_logger(log_file, __name__)
+
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def connect(self):
+        """
+        Perform login (if not logged in yet).
+        """
+        if self.xsrf_token is None:
+            await self.__renew_token(None)
+
+
+    async def close(self):
+        """
+        Close all pooled connections of the client.
+        """
+        session, self.session = self.session, None
+        await self.__close_session(session, self.session_loop)
+
+
+    async def __ensure_session(self):
+        """
+        Create the session and semaphore in the running event loop. A session
+        created in another event loop is closed.
+        """
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed and self.session_loop is loop:
+            return
+
+        stale, stale_loop = self.session, self.session_loop
+        self.session_loop = loop
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+                            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                            timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        await self.__close_session(stale, stale_loop)
+
+
+    async def __close_session(self, session, loop):
+        """
+        Close a session created in the given event loop.
+        """
+        if session is None or session.closed:
+            return
+
+        if loop is not None and loop is not asyncio.get_running_loop() and loop.is_running():
+            # Still running in another thread, close the session there
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        else:
+            await session.close()
+
+
+    def __login_lock(self):
+        """
+        Return the login lock of the running event loop (an asyncio.Lock can
+        only be used in one event loop).
+        """
+        loop = asyncio.get_running_loop()
+        if self.login_lock is None or self.login_loop is not loop:
+            self.login_lock = asyncio.Lock()
+            self.login_loop = loop
+
+        return self.login_lock
+
+
+    async def __http_post(self, name, url, header, data):
+        """
+        Send a POST request, returning (response body, response headers).
+        """
+        await self.__ensure_session()
+
+        async with self.semaphore:
+            async with self.session.post(url, headers=header, data=self.codec.dumps(data)) as response:
+                content = await response.read()
+                headers = response.headers
+
+        log_request(self.logger, self.log_counters, name, url, header, data, content)
+
+        return content, headers
+
+
+    async def login(self):
+        """
+        Login and extract XSRF-TOKEN for next requests (see
+        HuaweiFusionSolar.login).
+        """
+        # Request URL
+        COMMAND_URL = f'{self.endpoint}/thirdData/login'
+        _NAME = self.login.__name__
+
+        # Request parameters
+        data = {
+            "userName" : self.client_name,
+            "systemCode" : self.client_pass
+        }
+
+        content, headers = await self.__http_post(_NAME, COMMAND_URL, JSON_HEADER, data)
+
+        # Set the xsrf-token
+        self.xsrf_token = login_token(self.codec.loads(content), headers)
+
+
+    async def __renew_token(self, stale_token):
+        """
+        Renew the xsrf-token if it is still stale_token (one login at a time,
+        waiting callers reuse its token).
+        """
+        async with self.__login_lock():
+            if self.xsrf_token != stale_token:
+                return
+
+            await self.login()
+            if stale_token is not None:
+                self.relogin_count += 1
+
+
+    async def __acquire(self, name):
+        """
+        Wait for (or fail on) the method quota without blocking the loop.
+        """
+        while True:
+            delay = self.quota.try_acquire(name)
+            if delay is None:
+                return
+
+            await asyncio.sleep(delay)
+
+
+    async def __post(self, name, url, data):
+        """
+        Send an authenticated request and return its 'data' (see
+        HuaweiFusionSolar.__post).
+        """
+        await self.connect()
+        await self.__acquire(name)
+
+        for attempt in range(LOGIN_RETRIES + 1):
+            xsrf_token = self.xsrf_token
+
+            # Request headers
+            header = request_header(xsrf_token)
+
+            content, headers = await self.__http_post(name, url, header, data)
+
+            json_response = self.codec.loads(content, RESPONSE_KEYS)
+            # Check if xsrf-token has to be refreshed
+            delay = relogin_delay(json_response, attempt)
+            if delay is None:
+                break
+
+            await asyncio.sleep(delay)
+            await self.__renew_token(xsrf_token)
+
+        return response_data(name, json_response)
+
+
+    def quota_remaining(self, name=None):
+        """
+        Return the remaining API calls for the given method name in its quota
+        window (or a dictionary with all methods if name is None).
+        """
+        return self.quota.remaining(name)
+
+
+    async def __request_chunked(self, name, url, data, key):
+        """
+        Send a request for the ids of data[key] in chunks of ID_CHUNK_SIZE,
+        concurrently, and merge their 'data' lists in chunk order.
+        """
+        chunks = chunk_requests(self.quota, name, data, key)
+        if len(chunks) == 1:
+            return await self.__post(name, url, chunks[0])
+
+        return merge_results(await asyncio.gather(*[self.__post(name, url, chunk) for chunk in chunks]))
+
+
+    def __device_data(self, devTypeId, devIds, sns, **kwargs):
+        """
+        Return (request parameters, ids key) of a device request.
+        """
+        data = { "devTypeId" : devTypeId, **kwargs }
+        if devIds is not None:
+            data['devIds'] = devIds
+        if sns is not None:
+            data['sns'] = sns
+
+        return data, "devIds" if devIds is not None else "sns"
+
+
+    async def logout(self):
+        """
+        Force the XSRF-TOKEN to expire immediately (see
+        HuaweiFusionSolar.logout).
+        """
+        # Request URL
+        COMMAND_URL = f'{self.endpoint}/thirdData/logout'
+        _NAME = self.logout.__name__
+
+        # Request parameters
+        data = {
+            "xsrfToken" : self.xsrf_token
+        }
+
+        content, headers = await self.__http_post(_NAME, COMMAND_URL, JSON_HEADER, data)
+
+        json_response = self.codec.loads(content)
+        if json_response['success'] == False:
+            raise ValueError("Logout error (%s)" % json_response)
+
+
+    async def plant_list(self, pageNo, startTime=None, endTime=None):
+        """
+        Get the plant list (see HuaweiFusionSolar.plant_list).
+
+        Request URL: https://<domain>/thirdData/stations
+        """
+        # Request URL
+        COMMAND_URL = f'{self.endpoint}/thirdData/stations'
+        _NAME = self.plant_list.__name__
+
+        # Request parameters
+        data = { "pageNo" : pageNo }
+
+        if startTime is not None:
+            data['gridConnectedStartTime'] = startTime
+        if endTime is not None:
+            data['gridConnectedEndTime'] = endTime
+
+        result = await self.__post(_NAME, COMMAND_URL, data)
+
+        # Scale the quotas to the number of plants of the account
+        if isinstance(result, dict) and 'total' in result:
+            self.quota.observe(_NAME, int(result['total']))
+
+        return result
+
+
+    async def plant_real_time_data(self, stationCodes):
+        """
+        Get real time data for one or multiple plants (see
+        HuaweiFusionSolar.plant_real_time_data).
+
+        Request URL: https://<domain>/thirdData/getStationRealKpi
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getStationRealKpi'
+        _NAME = self.plant_real_time_data.__name__
+
+        data = { "stationCodes" : stationCodes }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def plant_hourly_data(self, stationCodes, collectTime):
+        """
+        Get hourly data for one or multiple plants (see
+        HuaweiFusionSolar.plant_hourly_data).
+
+        Request URL: https://<domain>/thirdData/getKpiStationHour
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationHour'
+        _NAME = self.plant_hourly_data.__name__
+
+        data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def plant_daily_data(self, stationCodes, collectTime):
+        """
+        Get daily data for one or multiple plants (see
+        HuaweiFusionSolar.plant_daily_data).
+
+        Request URL: https://<domain>/thirdData/getKpiStationDay
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationDay'
+        _NAME = self.plant_daily_data.__name__
+
+        data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def plant_monthly_data(self, stationCodes, collectTime):
+        """
+        Get monthly data for one or multiple plants (see
+        HuaweiFusionSolar.plant_monthly_data).
+
+        Request URL: https://<domain>/thirdData/getKpiStationMonth
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationMonth'
+        _NAME = self.plant_monthly_data.__name__
+
+        data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def plant_yearly_data(self, stationCodes, collectTime):
+        """
+        Get yearly data for one or multiple plants (see
+        HuaweiFusionSolar.plant_yearly_data).
+
+        Request URL: https://<domain>/thirdData/getKpiStationYear
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationYear'
+        _NAME = self.plant_yearly_data.__name__
+
+        data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def device_list(self, stationCodes):
+        """
+        Get devices information associated with given plants (see
+        HuaweiFusionSolar.device_list).
+
+        Request URL: https://<domain>/thirdData/getDevList
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevList'
+        _NAME = self.device_list.__name__
+
+        data = { "stationCodes" : stationCodes }
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
+
+
+    async def device_real_time_data(self, devTypeId, devIds=None, sns=None):
+        """
+        Get real time data for one or multiple devices of the same type (see
+        HuaweiFusionSolar.device_real_time_data).
+
+        Request URL: https://<domain>/thirdData/getDevRealKpi
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevRealKpi'
+        _NAME = self.device_real_time_data.__name__
+
+        # Either sns or devIds must be set
+        if devIds is None and sns is None:
+            return
+
+        data, key = self.__device_data(devTypeId, devIds, sns)
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, key)
+
+
+    async def device_history_data(self, devTypeId, startTime, endTime, devIds=None, sns=None):
+        """
+        Get history data for one or multiple devices of the same type (see
+        HuaweiFusionSolar.device_history_data).
+
+        Request URL: https://<domain>/thirdData/getDevHistoryKpi
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevHistoryKpi'
+        _NAME = self.device_history_data.__name__
+
+        # Either sns or devIds must be set
+        if devIds is None and sns is None:
+            return
+
+        data, key = self.__device_data(devTypeId, devIds, sns, startTime=startTime, endTime=endTime)
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, key)
+
+
+    async def device_daily_data(self, devTypeId, collectTime, devIds=None, sns=None):
+        """
+        Get daily data for one or multiple devices of the same type (see
+        HuaweiFusionSolar.device_daily_data).
+
+        Request URL: https://<domain>/thirdData/getDevKpiDay
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiDay'
+        _NAME = self.device_daily_data.__name__
+
+        # Either sns or devIds must be set
+        if devIds is None and sns is None:
+            return
+
+        data, key = self.__device_data(devTypeId, devIds, sns, collectTime=collectTime)
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, key)
+
+
+    async def device_monthly_data(self, devTypeId, collectTime, devIds=None, sns=None):
+        """
+        Get monthly data for one or multiple devices of the same type (see
+        HuaweiFusionSolar.device_monthly_data).
+
+        Request URL: https://<domain>/thirdData/getDevKpiMonth
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiMonth'
+        _NAME = self.device_monthly_data.__name__
+
+        # Either sns or devIds must be set
+        if devIds is None and sns is None:
+            return
+
+        data, key = self.__device_data(devTypeId, devIds, sns, collectTime=collectTime)
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, key)
+
+
+    async def device_yearly_data(self, devTypeId, collectTime, devIds=None, sns=None):
+        """
+        Get yearly data for one or multiple devices of the same type (see
+        HuaweiFusionSolar.device_yearly_data).
+
+        Request URL: https://<domain>/thirdData/getDevKpiYear
+        """
+        COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiYear'
+        _NAME = self.device_yearly_data.__name__
+
+        # Either sns or devIds must be set
+        if devIds is None and sns is None:
+            return
+
+        data, key = self.__device_data(devTypeId, devIds, sns, collectTime=collectTime)
+
+        return await self.__request_chunked(_NAME, COMMAND_URL, data, key)
+
+
+    async def real_time_sweep(self, devices):
+        """
+        Get real time data for devices of several types concurrently.
+
+        Parameters:
+            devices         : Dictionary with device type as key and device ids
+                              (comma separated string or list) as value.
+
+        Return a dictionary with device type as key and its 'data' as value.
+        """
+        types = list(devices)
+        results = await asyncio.gather(*[self.device_real_time_data(devTypeId, devIds=devices[devTypeId])
+                                            for devTypeId in types])
+
+        return dict(zip(types, results))
@@ -0,0 +1,77 @@
+
+from HuaweiInverter import DEVICE_TYPE
+from AsyncHuaweiFusionSolar import AsyncHuaweiFusionSolar
+
+"""
+AsyncHuaweiInverter is the asyncio counterpart of HuaweiInverter (see
+AsyncHuaweiFusionSolar): same methods, as coroutines.
+
+The device type must be given (there is no async device topology).
+"""
+
+class AsyncHuaweiInverter(AsyncHuaweiFusionSolar):
+    def __init__(self, client_name=None, client_pass=None, client_domain=None, device_type=None, device_id=None, log_file=None, **kwargs):
+        """
+        Create an async Huawei SmartPVMS inverter client (login is performed on
+        first use or by connect).
+
+        Parameters:
+            client_name     : Client username for SmartPVMS access.
+            client_pass     : Client password for SmartPVMS access.
+            client_domain   : Client domain name of the SmartPVMS system.
+            device_type     : Inverter device type ("string" | "residential")
+            device_id       : Inverter device id.
+            log_file        : Filename to be used for logging
+            kwargs          : Options forwarded to AsyncHuaweiFusionSolar
+                              (max_concurrency, timeout, quota, json_codec).
+        """
+        # Validate device_type
+        if device_type not in DEVICE_TYPE:
+            raise ValueError("Invalid value for device type!")
+
+        self.device_id = device_id
+        self.device_type = DEVICE_TYPE[device_type]
+
+        # Call constructor for AsyncHuaweiFusionSolar
+        super().__init__(client_name, client_pass, client_domain, log_file, **kwargs)
+
+
+    async def real_time_data(self):
+        """
+        Get inverter real time data.
+        """
+        return await super().device_real_time_data(self.device_type,
+                                                devIds = self.device_id)
+
+
+    async def daily_data(self, collectTime):
+        """
+        Get inverter daily data.
+        """
+        return await super().device_daily_data(self.device_type, collectTime,
+                                            devIds = self.device_id)
+
+
+    async def monthly_data(self, collectTime):
+        """
+        Get inverter monthly data.
+        """
+        return await super().device_monthly_data(self.device_type, collectTime,
+                                                devIds = self.device_id)
+
+
+    async def yearly_data(self, collectTime):
+        """
+        Get inverter yearly data.
+        """
+        return await super().device_yearly_data(self.device_type, collectTime,
+                                                devIds = self.device_id)
+
+
+    async def real_time_active_power(self):
+        """
+        Get real time inverter active power.
+        """
+        data = await self.real_time_data()
+
+        return data[0]['dataItemMap']['active_power']
@@ -0,0 +1,146 @@
+import time
+import threading
+"""
+DeviceTopology is an in-memory index of the plants and devices of a
+SmartPVMS account, built from device_list.
+
+The index is loaded on first use and reloaded when older than the refresh
+interval. Lookups are dictionary accesses:
+    - station_devices   devices of a plant (optionally of one type)
+    - dev_id / sn       device id <-> serial number
+    - dev_type          device type of a device
+    - group_by_type     device ids grouped by device type (one getDevRealKpi
+                        request per type)
+
+All ids are handled as strings.
+"""
+
+################################################################################
+# Topology config.
+################################################################################
+TOPOLOGY_REFRESH = 24 * 60 * 60     # Reload interval (seconds)
+
+
+class DeviceTopology(object):
+    def __init__(self, client, stationCodes=None, refresh_interval=TOPOLOGY_REFRESH):
+        """
+        Create a device topology index.
+
+        Parameters:
+            client          : HuaweiFusionSolar client.
+            stationCodes    : Plants to index (default all plants of account)
+            refresh_interval: Reload interval (seconds)
+        """
+        self.client = client
+        self.stationCodes = stationCodes
+        self.refresh_interval = refresh_interval
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+        self.devices = {}
+        self.by_station = {}
+        self.by_sn = {}
+
+
+    def __stations(self):
+        """
+        Return the plants to index.
+        """
+        if self.stationCodes is not None:
+            return self.stationCodes
+
+        return [plant['plantCode'] for plant in self.client.plants()]
+
+
+    def load(self):
+        """
+        (Re)load the index from SmartPVMS.
+        """
+        devices = {}
+        by_station = {}
+        by_sn = {}
+
+        stations = self.__stations()
+        rows = self.client.device_list(stations) if stations else []
+        for row in rows or []:
+            dev_id = str(row['id'])
+            devices[dev_id] = row
+            by_station.setdefault(str(row.get('stationCode')), {}) \
+                      .setdefault(row.get('devTypeId'), []).append(dev_id)
+            if row.get('esnCode'):
+                by_sn[row['esnCode']] = dev_id
+
+        # Replace the index at once (lookups never see a partial index)
+        self.devices, self.by_station, self.by_sn = devices, by_station, by_sn
+        self.loaded_at = time.time()
+
+
+    def __ensure(self):
+        """
+        Load the index if not loaded yet or expired.
+        """
+        if self.loaded_at is not None and time.time() - self.loaded_at < self.refresh_interval:
+            return
+
+        with self.lock:
+            if self.loaded_at is None or time.time() - self.loaded_at >= self.refresh_interval:
+                self.load()
+
+
+    def device(self, devId):
+        """
+        Return the device_list row of a device (None if unknown).
+        """
+        self.__ensure()
+        return self.devices.get(str(devId))
+
+
+    def dev_type(self, devId):
+        """
+        Return the device type of a device (None if unknown).
+        """
+        row = self.device(devId)
+        return None if row is None else row.get('devTypeId')
+
+
+    def sn(self, devId):
+        """
+        Return the serial number of a device (None if unknown).
+        """
+        row = self.device(devId)
+        return None if row is None else row.get('esnCode')
+
+
+    def dev_id(self, sn):
+        """
+        Return the device id of a serial number (None if unknown).
+        """
+        self.__ensure()
+        return self.by_sn.get(sn)
+
+
+    def station_devices(self, stationCode, devTypeId=None):
+        """
+        Return the device ids of a plant, optionally of a single device type.
+        """
+        self.__ensure()
+        types = self.by_station.get(str(stationCode), {})
+        if devTypeId is not None:
+            return list(types.get(devTypeId, []))
+
+        return [dev_id for ids in types.values() for dev_id in ids]
+
+
+    def group_by_type(self, devIds):
+        """
+        Return a dictionary with device type as key and the list of given
+        device ids of that type as value (unknown devices are skipped).
+        """
+        self.__ensure()
+        groups = {}
+        for dev_id in devIds:
+            row = self.devices.get(str(dev_id))
+            if row is not None:
+                groups.setdefault(row.get('devTypeId'), []).append(str(dev_id))
+
+        return groups
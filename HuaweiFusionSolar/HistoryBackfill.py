@@ -0,0 +1,128 @@
+import os
+import json
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+"""
+HistoryBackfill fetches device history data (device_history_data) for a time
+range longer than the one accepted by a single getDevHistoryKpi request.
+
+The range is split in windows of at most BACKFILL_WINDOW that are fetched
+concurrently through the client (so quota, token renewal and id chunking still
+apply). Results are yielded as windows complete.
+
+Completed windows are recorded in an optional checkpoint file before they are
+yielded, so a backfill interrupted by a crash, by an exhausted quota
+(QuotaExceededError) or by a caller that stops iterating resumes with the
+remaining windows when run again.
+"""
+
+################################################################################
+# Backfill config.
+################################################################################
+BACKFILL_WINDOW = 3 * 24 * 60 * 60 * 1000   # Maximum request time span (ms)
+BACKFILL_WORKERS = 4                        # Concurrent window requests
+
+
+class HistoryBackfill(object):
+    def __init__(self, client, devTypeId, startTime, endTime, devIds=None, sns=None,
+                checkpoint=None, window=BACKFILL_WINDOW, max_workers=BACKFILL_WORKERS):
+        """
+        Create a history backfill.
+
+        Parameters:
+            client          : HuaweiFusionSolar client.
+            devTypeId       : Device type.
+            startTime       : Range start time in miliseconds.
+            endTime         : Range end time in miliseconds.
+            devIds          : Device ids (comma separated string or list).
+            sns             : Device sns (comma separated string or list).
+            checkpoint      : File recording completed windows (optional).
+            window          : Window length in miliseconds.
+            max_workers     : Maximum concurrent window requests.
+        """
+        if devIds is None and sns is None:
+            raise ValueError("Either devIds or sns must be set!")
+
+        self.client = client
+        self.devTypeId = devTypeId
+        self.startTime = startTime
+        self.endTime = endTime
+        self.devIds = devIds
+        self.sns = sns
+        self.checkpoint = checkpoint
+        self.window = window
+        self.max_workers = max_workers
+
+
+    def windows(self):
+        """
+        Return the list of (startTime, endTime) windows of the range.
+        """
+        return [(start, min(start + self.window, self.endTime))
+                for start in range(self.startTime, self.endTime, self.window)]
+
+
+    def completed(self):
+        """
+        Return the set of windows recorded in the checkpoint file.
+        """
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return set()
+
+        with open(self.checkpoint) as f:
+            return { tuple(json.loads(line)) for line in f if line.strip() }
+
+
+    def __record(self, window):
+        """
+        Append a completed window to the checkpoint file.
+        """
+        if self.checkpoint is None:
+            return
+
+        with open(self.checkpoint, 'a') as f:
+            f.write(json.dumps(list(window)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+    def __fetch(self, window):
+        return self.client.device_history_data(self.devTypeId, window[0], window[1],
+                                            devIds=self.devIds, sns=self.sns)
+
+
+    def run(self):
+        """
+        Fetch the remaining windows, yielding (startTime, endTime, data) as each
+        window completes (not necessarily in time order).
+        """
+        done = self.completed()
+        remaining = [w for w in self.windows() if w not in done]
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            running = {}
+            while remaining or running:
+                # Keep at most max_workers windows in flight
+                while remaining and len(running) < self.max_workers:
+                    window = remaining.pop(0)
+                    running[executor.submit(self.__fetch, window)] = window
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                error = None
+                for future in finished:
+                    window = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+
+                    self.__record(window)
+                    yield window[0], window[1], future.result()
+
+                # Errors (ex: QuotaExceededError) stop the backfill once the
+                # other windows of the batch are recorded, the next run
+                # resumes from the checkpoint
+                if error is not None:
+                    raise error
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,162 @@
+import json
+import time
+import sqlite3
+import threading
+
+from datetime import datetime, timedelta
+"""
+HistoryCache is a persistent (SQLite) read-through cache for the daily, monthly
+and yearly KPI methods of HuaweiFusionSolar.
+
+Each request returns the data of a period containing collectTime:
+    - *_daily_data      days of the month
+    - *_monthly_data    months of the year
+    - *_yearly_data     the year(s)
+
+Once a period is closed (its end plus CLOSE_GRACE is in the past), its data
+never changes, so it is stored per plant/device id and served locally from then
+on. Requests for the open period are always sent to SmartPVMS.
+
+The rows of an id are only stored if all of them belong to closed periods: a
+response spanning the open period (ex: *_yearly_data listing every year up to
+the current one) is never cached, since its last row still changes.
+
+Ids without rows (device added later, transient empty answer) are cached for
+EMPTY_TTL only, then requested again.
+
+Periods are computed in the plants timezone (tz, default local time).
+"""
+
+################################################################################
+# Period covered by each method
+################################################################################
+PERIOD_MONTH = "month"
+PERIOD_YEAR = "year"
+
+HISTORY_PERIOD = {
+    "plant_daily_data" : PERIOD_MONTH,
+    "plant_monthly_data" : PERIOD_YEAR,
+    "plant_yearly_data" : PERIOD_YEAR,
+    "device_daily_data" : PERIOD_MONTH,
+    "device_monthly_data" : PERIOD_YEAR,
+    "device_yearly_data" : PERIOD_YEAR,
+}
+
+################################################################################
+# Time after the end of a period before it is considered closed (late data
+# uploaded by devices is still aggregated by SmartPVMS).
+################################################################################
+CLOSE_GRACE = timedelta(days=1)
+
+################################################################################
+# Time an empty answer for an id is cached (seconds).
+################################################################################
+EMPTY_TTL = 24 * 60 * 60
+
+
+class HistoryCache(object):
+    def __init__(self, path, tz=None, empty_ttl=EMPTY_TTL):
+        """
+        Open (or create) a history cache.
+
+        Parameters:
+            path            : SQLite database file.
+            tz              : Plants timezone (datetime.tzinfo, default local)
+            empty_ttl       : Time an empty answer for an id is cached (seconds)
+        """
+        self.tz = tz
+        self.empty_ttl = empty_ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS history ("
+                        "method TEXT, id TEXT, period INTEGER, data TEXT, "
+                        "PRIMARY KEY (method, id, period))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS history_empty ("
+                        "method TEXT, id TEXT, period INTEGER, expire REAL, "
+                        "PRIMARY KEY (method, id, period))")
+        self.db.commit()
+
+
+    def period(self, name, collectTime):
+        """
+        Return (period start in ms, closed) of the period of collectTime for
+        method name, or None if the method is not cached.
+        """
+        if name not in HISTORY_PERIOD:
+            return None
+
+        t = datetime.fromtimestamp(collectTime / 1000, self.tz)
+
+        if HISTORY_PERIOD[name] == PERIOD_MONTH:
+            start = t.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            if start.month == 12:
+                end = start.replace(year=start.year + 1, month=1)
+            else:
+                end = start.replace(month=start.month + 1)
+        else:
+            start = t.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            end = start.replace(year=start.year + 1)
+
+        closed = end + CLOSE_GRACE <= datetime.now(self.tz)
+
+        return int(start.timestamp() * 1000), closed
+
+
+    def __closed(self, name, row):
+        """
+        Check if a returned row belongs to a closed period.
+        """
+        collectTime = row.get('collectTime')
+
+        return collectTime is not None and self.period(name, collectTime)[1]
+
+
+    def get(self, name, ids, period):
+        """
+        Return a dictionary with the cached rows of each id (missing ids are not
+        included, ids with an unexpired empty answer have no rows).
+        """
+        result = {}
+        now = time.time()
+
+        with self.lock:
+            for i in ids:
+                row = self.db.execute("SELECT data FROM history WHERE "
+                                    "method = ? AND id = ? AND period = ?",
+                                    (name, i, period)).fetchone()
+                if row is not None:
+                    result[i] = json.loads(row[0])
+                    continue
+
+                row = self.db.execute("SELECT expire FROM history_empty WHERE "
+                                    "method = ? AND id = ? AND period = ?",
+                                    (name, i, period)).fetchone()
+                if row is not None and row[0] > now:
+                    result[i] = []
+
+        return result
+
+
+    def put(self, name, rows_by_id, period):
+        """
+        Store the rows returned for each id of a closed period. Rows spanning an
+        open period are not stored, empty answers are stored for empty_ttl.
+        """
+        expire = time.time() + self.empty_ttl
+        rows = [(name, i, period, json.dumps(r)) for i, r in rows_by_id.items()
+                    if r and all(self.__closed(name, row) for row in r)]
+        empty = [(name, i, period, expire) for i, r in rows_by_id.items() if not r]
+
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?)", rows)
+            if self.empty_ttl:
+                self.db.executemany("INSERT OR REPLACE INTO history_empty VALUES (?, ?, ?, ?)", empty)
+            self.db.commit()
+
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self.lock:
+            self.db.close()
@@ -1,8 +1,23 @@
-import json
-import logging
+import os
+import sys
+import time
 import requests
-
-from logging.handlers import RotatingFileHandler
+import threading
+
+# Modules shared by the HuaweiFusionSolar and TuyaCloud clients
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Common'))
+
+from concurrent.futures import ThreadPoolExecutor
+from JsonCodec import default_codec
+from QueueLogger import LOGGER_BODY_MAX, LogBody, get_logger, sampled
+from requests.adapters import HTTPAdapter
+from ResponseCache import ResponseCache
+from DeviceTopology import DeviceTopology
+from KpiTimeSeries import KpiTimeSeries
+from KpiRecord import StationKpiRecord, DeviceKpiRecord
+from HistoryBackfill import HistoryBackfill
+from PlantEnumerator import PlantEnumerator
+from QuotaScheduler import QuotaScheduler
 """
 Northbound Interface Reference-V6 (SmartPVMS)
 
@@ -14,11 +29,12 @@ https://support.huawei.com/enterprise/en/energy-common/imaster-neteco-pid-251993
 """
 
 ################################################################################
-# Logger config.
+# Logger config. (log files are written by QueueLogger)
 ################################################################################
-LOGGER_LOG_LEVEL = logging.DEBUG    # Default logging level
-LOGGER_FILE_SIZE = 10000000         # 10 MB
-LOGGER_FILE_BACKUP = 5              # Number of backup files
+LOGGER_SAMPLE_RATE = {              # Log 1 of N requests of high rate methods
+    "plant_real_time_data" : 10,
+    "device_real_time_data" : 10,
+}
 
 
 ################################################################################
@@ -28,10 +44,130 @@ LOGGER_FILE_BACKUP = 5              # Number of backup files
 # refreshed by performing login method
 ################################################################################
 EXPIRED_TOKEN = 305
+RESPONSE_KEYS = ("success", "failCode", "message", "data")
+JSON_HEADER = { "Content-Type" : "application/json" }
+LOGIN_RETRIES = 3                   # Maximum re-logins for a single request
+LOGIN_BACKOFF = 1                   # Initial backoff (seconds) between re-logins
+
+
+################################################################################
+# HTTP transport config.
+#
+# All requests of a client instance are sent through a single keep-alive
+# session, so the TCP + TLS handshake with the SmartPVMS domain is paid once
+# per pooled connection instead of once per request.
+################################################################################
+POOL_CONNECTIONS = 1                # Number of per-host pools to keep
+POOL_MAXSIZE = 10                   # Maximum connections kept per host
+POOL_BLOCK = True                   # Wait for a free connection when full
+
+
+################################################################################
+# Multiple ids requests config.
+#
+# stationCodes, devIds and sns accept at most 100 ids per request. Longer id
+# lists are split in chunks sent concurrently and the 'data' lists merged.
+################################################################################
+ID_CHUNK_SIZE = 100                 # Maximum ids per request
+MAX_WORKERS = 8                     # Maximum concurrent chunk requests
+
+
+################################################################################
+# Request helpers
+#
+# No I/O, shared by HuaweiFusionSolar and AsyncHuaweiFusionSolar (which only
+# differ in the way requests are sent).
+################################################################################
+def split_ids(ids):
+    """
+    Return ids (comma separated string, list or single id) as a list of
+    strings.
+    """
+    if isinstance(ids, (list, tuple, set)):
+        return [str(i) for i in ids]
+
+    return [i.strip() for i in str(ids).split(',') if i.strip()]
+
+
+def chunk_requests(quota, name, data, key):
+    """
+    Return the request parameters for the ids of data[key] in chunks of
+    ID_CHUNK_SIZE (a single request if they fit in one), once the number of
+    ids is observed by the method quota.
+    """
+    ids = split_ids(data[key])
+    quota.observe(name, len(ids), data.get('devTypeId'))
+
+    return [dict(data, **{ key : ','.join(ids[i:i + ID_CHUNK_SIZE]) })
+                for i in range(0, max(len(ids), 1), ID_CHUNK_SIZE)]
+
+
+def merge_results(results):
+    """
+    Return the 'data' lists of chunk requests merged in chunk order.
+    """
+    merged = []
+    for result in results:
+        merged.extend(result or [])
+
+    return merged
+
+
+def request_header(xsrf_token):
+    return { "XSRF-TOKEN" : xsrf_token, **JSON_HEADER }
+
+
+def relogin_delay(json_response, attempt):
+    """
+    Return None if the response of the given attempt is final, otherwise the
+    seconds to wait before renewing the expired xsrf-token and retrying (at
+    most LOGIN_RETRIES times, exponential backoff between re-logins).
+    """
+    if json_response['failCode'] != EXPIRED_TOKEN or attempt == LOGIN_RETRIES:
+        return None
+
+    return LOGIN_BACKOFF * 2 ** (attempt - 1) if attempt > 0 else 0
+
+
+def response_data(name, json_response):
+    """
+    Return the 'data' of a response, raising ValueError if the request failed.
+    """
+    if json_response['success'] == False:
+        raise ValueError("%s: (%s)" % (name, json_response))
+
+    return json_response['data']
+
+
+def login_token(json_response, headers):
+    """
+    Return the xsrf-token of a login response.
+    """
+    if json_response['success'] == False:
+        raise ValueError("Login error (%s)" % json_response)
+
+    return headers['xsrf-token']
+
+
+def log_request(logger, counters, name, url, header, data, content):
+    """
+    Log a request and its response (sampled, see LOGGER_SAMPLE_RATE, and
+    formatted by the logging thread).
+    """
+    if not sampled(logger, LOGGER_SAMPLE_RATE, name, counters):
+        return
+
+    logger.debug("[%s] url=[%s]; headers=[%s]; json=[%s]", name, url,
+                header, LogBody(data))
+    if LOGGER_BODY_MAX != 0:
+        logger.debug("[%s] response=[%s]", name, LogBody(content))
 
 
 class HuaweiFusionSolar(object):
-    def __init__(self, client_name=None, client_pass=None, client_domain=None, log_file=None):
+    def __init__(self, client_name=None, client_pass=None, client_domain=None, log_file=None,
+                pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                max_workers=MAX_WORKERS, quota=None, cache=None, history=None,
+                json_codec=None, rollup=None):
         """
         Connect to Huawei SmartPVMS
 
@@ -40,42 +176,84 @@ class HuaweiFusionSolar(object):
             client_pass     : Client password for SmartPVMS access.
             client_domain   : Client domain name of the SmartPVMS system.
             log_file        : Filename to be used for logging
+            pool_connections: Number of per-host connection pools to keep.
+            pool_maxsize    : Maximum keep-alive connections per host.
+            max_workers     : Maximum concurrent requests for multiple ids.
+            quota           : QuotaScheduler enforcing the API call budgets
+                              (share it between clients of the same user).
+            cache           : ResponseCache for real time data (per method TTL).
+            history         : HistoryCache storing daily/monthly/yearly data of
+                              closed periods (optional).
+            json_codec      : JsonCodec used for requests and responses
+                              (default_codec() if None).
+            rollup          : KpiRollup fed with the device real time and
+                              history data received (optional).
         """
 
         self.logger = None
+        self.log_counters = {}
         self.xsrf_token = None
+        self.relogin_count = 0
+        self.login_lock = threading.Lock()
+        self.quota = quota if quota is not None else QuotaScheduler()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.history = history
+        self.rollup = rollup
+        self.codec = json_codec if json_codec is not None else default_codec()
+
+        # Plants/devices index of the account (loaded on first use)
+        self.topology = DeviceTopology(self)
         self.client_name = client_name
         self.client_pass = client_pass
         self.endpoint = f'https://{client_domain}'
 
+        # Create the pooled keep-alive session used by all requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+                            pool_connections=pool_connections,
+                            pool_maxsize=pool_maxsize,
+                            pool_block=POOL_BLOCK
+                            )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Worker pool for multiple ids requests (created on first use)
+        self.executor = None
+        self.max_workers = max_workers
+        self.executor_lock = threading.Lock()
+
         # Configure logger (if given)
         if log_file is not None:
-            self.logger = logging.getLogger(__name__)
-            self.logger.setLevel(LOGGER_LOG_LEVEL)
+            self.logger = get_logger(log_file, __name__)
 
-            # Create a rotating file handler
-            file_handler = RotatingFileHandler(
-                                        log_file,
-                                        maxBytes=LOGGER_FILE_SIZE,
-                                        backupCount=LOGGER_FILE_SIZE
-                                            )
+        # Perform login to get xsrf-token
+        try:
+            self.login()
+        except Exception:
+            self.close()
+            raise
 
-            # Set the desired log level and format
-            file_handler.setLevel(LOGGER_LOG_LEVEL)
-            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-            file_handler.setFormatter(formatter)
 
-            # Add the file handler to the logger
-            self.logger.addHandler(file_handler)
+    def __enter__(self):
+        return self
 
-        # Perform login to get xsrf-token
-        self.login()
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """
+        Close all pooled connections and workers of the client.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+        self.session.close()
 
-    def __log_debug(self, format_str, *args):
-        if self.logger:
-            message = format_str % args
-            self.logger.debug(message)
+    def __log_request(self, name, url, header, data, response):
+        log_request(self.logger, self.log_counters, name, url, header, data, response.content)
 
     def login(self):
         """
@@ -100,16 +278,140 @@ class HuaweiFusionSolar(object):
         }
 
         # Send request
-        self.__log_debug("[%s] url=[%s]; json=[%s]", _NAME, COMMAND_URL, data)
-        response = requests.post(COMMAND_URL, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        if json_response['success'] == False:
-            raise ValueError("Login error (%s)" % json_response)
+        response = self.session.post(COMMAND_URL, headers=JSON_HEADER,
+                                    data=self.codec.dumps(data))
+        self.__log_request(_NAME, COMMAND_URL, JSON_HEADER, data, response)
 
         # Set the xsrf-token
-        self.xsrf_token = response.headers['xsrf-token']
+        self.xsrf_token = login_token(self.codec.loads(response.content), response.headers)
+
+
+    def __renew_token(self, stale_token):
+        """
+        Renew the xsrf-token if it is still stale_token.
+
+        Only one login is performed at a time; callers waiting for it reuse the
+        token it obtained instead of logging in again (SmartPVMS rate-limits
+        logins).
+        """
+        with self.login_lock:
+            if self.xsrf_token != stale_token:
+                return
+
+            self.login()
+            self.relogin_count += 1
+
+
+    def __request(self, name, url, data):
+        """
+        Return the 'data' of an authenticated request, served from the response
+        cache while still fresh.
+        """
+        return self.cache.get(name, data, lambda: self.__post(name, url, data))
+
+
+    def __post(self, name, url, data):
+        """
+        Send an authenticated request and return its 'data'.
+
+        When the xsrf-token has expired, it is renewed and the request retried,
+        at most LOGIN_RETRIES times with exponential backoff between re-logins.
+        """
+        # Wait for (or fail on) the method quota (requests rejected for an
+        # expired token are not charged again when retried)
+        self.quota.acquire(name)
+
+        for attempt in range(LOGIN_RETRIES + 1):
+            xsrf_token = self.xsrf_token
+
+            # Request headers
+            header = request_header(xsrf_token)
+
+            # Send request
+            response = self.session.post(url, headers=header, data=self.codec.dumps(data))
+            self.__log_request(name, url, header, data, response)
+
+            json_response = self.codec.loads(response.content, RESPONSE_KEYS)
+            # Check if xsrf-token has to be refreshed
+            delay = relogin_delay(json_response, attempt)
+            if delay is None:
+                break
+
+            time.sleep(delay)
+            self.__renew_token(xsrf_token)
+
+        return response_data(name, json_response)
+
+
+    def quota_remaining(self, name=None):
+        """
+        Return the remaining API calls for the given method name in its quota
+        window (or a dictionary with all methods if name is None).
+
+        Ex:
+            obj.quota_remaining('device_real_time_data')
+        """
+        return self.quota.remaining(name)
+
+
+    def __request_chunked(self, name, url, data, key):
+        """
+        Send a request for the ids of data[key] in chunks of ID_CHUNK_SIZE.
+
+        Chunks are sent concurrently (at most max_workers at a time) and their
+        'data' lists merged in chunk order.
+        """
+        chunks = chunk_requests(self.quota, name, data, key)
+        if len(chunks) == 1:
+            return self.__request(name, url, chunks[0])
+
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        return merge_results(self.executor.map(lambda d: self.__request(name, url, d), chunks))
+
+
+    def __records(self, record_class, result, as_records):
+        """
+        Return result as a list of records of record_class if as_records is set
+        (True for all KPIs or list of KPI names to parse).
+        """
+        if not as_records or result is None:
+            return result
+
+        return record_class.from_payload(result, None if as_records is True else as_records)
+
+
+    def __request_history(self, name, url, data, key):
+        """
+        Send a daily/monthly/yearly data request for the ids of data[key],
+        reading closed periods from (and storing them to) the history cache.
+
+        Only ids given as stationCodes or devIds are cached.
+        """
+        if self.history is None or key not in ("stationCodes", "devIds"):
+            return self.__request_chunked(name, url, data, key)
+
+        period, closed = self.history.period(name, data['collectTime'])
+        if not closed:
+            return self.__request_chunked(name, url, data, key)
+
+        ids = split_ids(data[key])
+        rows_by_id = self.history.get(name, ids, period)
+
+        # Request ids missing from cache and store their rows
+        missing = [i for i in ids if i not in rows_by_id]
+        if missing:
+            id_field = "stationCode" if key == "stationCodes" else "devId"
+            fetched = { i : [] for i in missing }
+            for row in self.__request_chunked(name, url, dict(data, **{ key : missing }), key) or []:
+                fetched.setdefault(str(row.get(id_field)), []).append(row)
+
+            self.history.put(name, fetched, period)
+            rows_by_id.update(fetched)
+
+        return [row for i in ids for row in rows_by_id.get(i, [])]
 
 
     def logout(self):
@@ -132,11 +434,11 @@ class HuaweiFusionSolar(object):
         }
 
         # Send request
-        self.__log_debug("[%s] url=[%s]; json=[%s]", _NAME, COMMAND_URL, data)
-        response = requests.post(COMMAND_URL, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
+        response = self.session.post(COMMAND_URL, headers=JSON_HEADER,
+                                    data=self.codec.dumps(data))
+        self.__log_request(_NAME, COMMAND_URL, JSON_HEADER, data, response)
 
-        json_response = json.loads(response.content)
+        json_response = self.codec.loads(response.content)
         if json_response['success'] == False:
             raise ValueError("Logout error (%s)" % json_response)
 
@@ -170,28 +472,34 @@ class HuaweiFusionSolar(object):
         if endTime is not None:
             data['gridConnectedEndTime'] = endTime
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        result = self.__request(_NAME, COMMAND_URL, data)
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_list(pageNo, startTime, endTime)
+        # Scale the quotas to the number of plants of the account
+        if isinstance(result, dict) and 'total' in result:
+            self.quota.observe(_NAME, int(result['total']))
+
+        return result
 
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
 
-        return json_response['data']
+    def plants(self, startTime=None, endTime=None, firstPage=1):
+        """
+        Get all plants of the account (see PlantEnumerator).
 
+        Return a generator of the plants ('list' entries of plant_list) in page
+        order. Pages after the first one are requested concurrently. If the
+        plant_list quota runs out, QuotaExceededError is raised with the page
+        to resume from (firstPage).
 
-    def plant_real_time_data(self, stationCodes):
+        Ex:
+            for plant in obj.plants():
+                print(plant['plantCode'])
+        """
+        enumerator = PlantEnumerator(self, startTime, endTime, firstPage=firstPage)
+
+        return enumerator.run()
+
+
+    def plant_real_time_data(self, stationCodes, as_records=False):
         """
         Get real time data for one or multiple plants. Maximum API calls per
         user every 5 minutes:
@@ -201,9 +509,12 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of StationKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getStationRealKpi'
@@ -212,28 +523,12 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        result = self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_real_time_data(stationCodes)
+        return self.__records(StationKpiRecord, result, as_records)
 
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
 
-        return json_response['data']
-
-
-    def plant_hourly_data(self, stationCodes, collectTime):
+    def plant_hourly_data(self, stationCodes, collectTime, as_series=False, as_records=False):
         """
         Get hourly data for one or multiple plants. Maximum API calls day:
         Roundup (Number of plants/100) + 24
@@ -242,11 +537,15 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
+        If as_series is set, the data is returned as a KpiTimeSeries.
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of StationKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationHour'
@@ -255,28 +554,13 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
-
-        # Send request
-        self.log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_hourly_data(stationCodes, collectTime)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
+        result = self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
 
-        return json_response['data']
+        return KpiTimeSeries.from_payload(result) if as_series else \
+               self.__records(StationKpiRecord, result, as_records)
 
 
-    def plant_daily_data(self, stationCodes, collectTime):
+    def plant_daily_data(self, stationCodes, collectTime, as_series=False, as_records=False):
         """
         Get daily data for one or multiple plants. Maximum API calls day:
         Roundup (Number of plants/100) + 24
@@ -286,11 +570,15 @@ class HuaweiFusionSolar(object):
 
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
+        If as_series is set, the data is returned as a KpiTimeSeries.
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of StationKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationDay'
@@ -299,28 +587,13 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
-
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_daily_data(stationCodes, collectTime)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
+        result = self.__request_history(_NAME, COMMAND_URL, data, "stationCodes")
 
-        return json_response['data']
+        return KpiTimeSeries.from_payload(result) if as_series else \
+               self.__records(StationKpiRecord, result, as_records)
 
 
-    def plant_monthly_data(self, stationCodes, collectTime):
+    def plant_monthly_data(self, stationCodes, collectTime, as_series=False, as_records=False):
         """
         Get monthly data for one or multiple plants. Maximum API calls day:
         Roundup (Number of plants/100) + 24
@@ -330,11 +603,15 @@ class HuaweiFusionSolar(object):
 
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
+        If as_series is set, the data is returned as a KpiTimeSeries.
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of StationKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationMonth'
@@ -343,28 +620,13 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        result = self.__request_history(_NAME, COMMAND_URL, data, "stationCodes")
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_monthly_data(stationCodes, collectTime)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
-
-        return json_response['data']
+        return KpiTimeSeries.from_payload(result) if as_series else \
+               self.__records(StationKpiRecord, result, as_records)
 
 
-    def plant_yearly_data(self, stationCodes, collectTime):
+    def plant_yearly_data(self, stationCodes, collectTime, as_series=False, as_records=False):
         """
         Get yearly data for one or multiple plants. Maximum API calls day:
         Roundup (Number of plants/100) + 24
@@ -374,11 +636,15 @@ class HuaweiFusionSolar(object):
 
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
+        If as_series is set, the data is returned as a KpiTimeSeries.
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of StationKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getKpiStationYear'
@@ -387,25 +653,10 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes, "collectTime" : collectTime }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        result = self.__request_history(_NAME, COMMAND_URL, data, "stationCodes")
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.plant_yearly_data(stationCodes, collectTime)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
-
-        return json_response['data']
+        return KpiTimeSeries.from_payload(result) if as_series else \
+               self.__records(StationKpiRecord, result, as_records)
 
 
     def device_list(self, stationCodes):
@@ -418,9 +669,10 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - stationCodes
-                Plants ids seppareted by comma. String. Mandatory
+                Plants ids seppareted by comma. String or list. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 plants).
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevList'
@@ -429,28 +681,10 @@ class HuaweiFusionSolar(object):
         # Request parameters
         data = { "stationCodes" : stationCodes }
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        return self.__request_chunked(_NAME, COMMAND_URL, data, "stationCodes")
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_list(stationCodes)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
 
-        return json_response['data']
-
-
-    def device_real_time_data(self, devTypeId, devIds=None, sns=None):
+    def device_real_time_data(self, devTypeId, devIds=None, sns=None, as_records=False):
         """
         Get real time data for one or multiple devices of the same type.
         Maximum API calls per user every 5 minutes:
@@ -460,13 +694,16 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - devIds
-                Device ids of the same type sepparated by comma. String. Optional
+                Device ids of the same type sepparated by comma. String or list. Optional
             - sns
-                Device sns of the same type sepparated by comma. String. Optional
+                Device sns of the same type sepparated by comma. String or list. Optional
             - devTypeId
                 Device type. Integer. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 devices).
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of DeviceKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevRealKpi'
@@ -483,28 +720,15 @@ class HuaweiFusionSolar(object):
         if sns is not None:
             data['sns'] = sns
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        key = "devIds" if devIds is not None else "sns"
+        result = self.__request_chunked(_NAME, COMMAND_URL, data, key)
+        if self.rollup is not None:
+            self.rollup.add_rows(result, devTypeId=devTypeId)
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_real_time_data(devTypeId, devIds, sns)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
-
-        return json_response['data']
+        return self.__records(DeviceKpiRecord, result, as_records)
 
 
-    def device_history_data(self, devTypeId, startTime, endTime, devIds=None, sns=None):
+    def device_history_data(self, devTypeId, startTime, endTime, devIds=None, sns=None, as_series=False, as_records=False):
         """
         Get history data for one or multiple devices of the same type.
         Maximum API calls per user per day:
@@ -514,9 +738,9 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - devIds
-                Device ids of the same type sepparated by comma. String. Optional
+                Device ids of the same type sepparated by comma. String or list. Optional
             - sns
-                Device sns of the same type sepparated by comma. String. Optional
+                Device sns of the same type sepparated by comma. String or list. Optional
             - devTypeId
                 Device type. Integer. Mandatory
             - startTime
@@ -524,7 +748,11 @@ class HuaweiFusionSolar(object):
             - endTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 devices).
+        If as_series is set, the data is returned as a KpiTimeSeries.
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of DeviceKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevHistoryKpi'
@@ -541,28 +769,16 @@ class HuaweiFusionSolar(object):
         if sns is not None:
             data['sns'] = sns
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        key = "devIds" if devIds is not None else "sns"
+        result = self.__request_chunked(_NAME, COMMAND_URL, data, key)
+        if self.rollup is not None:
+            self.rollup.add_rows(result, devTypeId=devTypeId)
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_history_data(devTypeId, startTime, endTime, devIds, sns)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
-
-        return json_response['data']
+        return KpiTimeSeries.from_payload(result) if as_series else \
+               self.__records(DeviceKpiRecord, result, as_records)
 
 
-    def device_daily_data(self, devTypeId, collectTime, devIds=None, sns=None):
+    def device_daily_data(self, devTypeId, collectTime, devIds=None, sns=None, as_records=False):
         """
         Get daily data for one or multiple devices of the same type.
         Maximum API calls per user per day:
@@ -572,15 +788,18 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - devIds
-                Device ids of the same type sepparated by comma. String. Optional
+                Device ids of the same type sepparated by comma. String or list. Optional
             - sns
-                Device sns of the same type sepparated by comma. String. Optional
+                Device sns of the same type sepparated by comma. String or list. Optional
             - devTypeId
                 Device type. Integer. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 devices).
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of DeviceKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiDay'
@@ -597,28 +816,13 @@ class HuaweiFusionSolar(object):
         if sns is not None:
             data['sns'] = sns
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
-
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_daily_data(devTypeId, collectTime, devIds, sns)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
+        key = "devIds" if devIds is not None else "sns"
+        result = self.__request_history(_NAME, COMMAND_URL, data, key)
 
-        return json_response['data']
+        return self.__records(DeviceKpiRecord, result, as_records)
 
 
-    def device_monthly_data(self, devTypeId, collectTime, devIds=None, sns=None):
+    def device_monthly_data(self, devTypeId, collectTime, devIds=None, sns=None, as_records=False):
         """
         Get monthly data for one or multiple devices of the same type.
         Maximum API calls per user per day:
@@ -628,15 +832,18 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - devIds
-                Device ids of the same type sepparated by comma. String. Optional
+                Device ids of the same type sepparated by comma. String or list. Optional
             - sns
-                Device sns of the same type sepparated by comma. String. Optional
+                Device sns of the same type sepparated by comma. String or list. Optional
             - devTypeId
                 Device type. Integer. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 devices).
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of DeviceKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiMonth'
@@ -653,28 +860,13 @@ class HuaweiFusionSolar(object):
         if sns is not None:
             data['sns'] = sns
 
-        # Create request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
-
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_monthly_data(devTypeId, collectTime, devIds, sns)
-
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
+        key = "devIds" if devIds is not None else "sns"
+        result = self.__request_history(_NAME, COMMAND_URL, data, key)
 
-        return json_response['data']
+        return self.__records(DeviceKpiRecord, result, as_records)
 
 
-    def device_yearly_data(self, devTypeId, collectTime, devIds=None, sns=None):
+    def device_yearly_data(self, devTypeId, collectTime, devIds=None, sns=None, as_records=False):
         """
         Get yearly data for one or multiple devices of the same type.
         Maximum API calls per user per day:
@@ -684,15 +876,18 @@ class HuaweiFusionSolar(object):
         Request Mode: POST
         Request Parameters:
             - devIds
-                Device ids of the same type sepparated by comma. String. Optional
+                Device ids of the same type sepparated by comma. String or list. Optional
             - sns
-                Device sns of the same type sepparated by comma. String. Optional
+                Device sns of the same type sepparated by comma. String or list. Optional
             - devTypeId
                 Device type. Integer. Mandatory
             - collectTime
                 Time in miliseconds. Long. Mandatory
 
-        On success, method return all 'data' returned by request.
+        On success, method return all 'data' returned by request (merged for
+        more than 100 devices).
+        If as_records is set (True or list of KPI names to parse), the data is
+        returned as a list of DeviceKpiRecord.
         """
         # Request URL
         COMMAND_URL = f'{self.endpoint}/thirdData/getDevKpiYear'
@@ -709,22 +904,43 @@ class HuaweiFusionSolar(object):
         if sns is not None:
             data['sns'] = sns
 
-        # Request headers
-        header = { "XSRF-TOKEN" : self.xsrf_token }
+        key = "devIds" if devIds is not None else "sns"
+        result = self.__request_history(_NAME, COMMAND_URL, data, key)
 
-        # Send request
-        self.__log_debug("[%s] url=[%s]; headers=[%s]; json=[%s]", _NAME,
-                        COMMAND_URL, header, data)
-        response = requests.post(COMMAND_URL, headers=header, json=data)
-        self.__log_debug("[%s] response=[%s]", _NAME, response.content)
-
-        json_response = json.loads(response.content)
-        # Check if xsrf-token has to be refreshed
-        if json_response['failCode'] == EXPIRED_TOKEN:
-            self.login()
-            return self.device_yearly_data(devTypeId, collectTime, devIds, sns)
+        return self.__records(DeviceKpiRecord, result, as_records)
 
-        if json_response['success'] == False:
-            raise ValueError("%s: (%s)" % (_NAME, json_response))
 
-        return json_response['data']
+    def device_history_backfill(self, devTypeId, startTime, endTime, devIds=None, sns=None, checkpoint=None):
+        """
+        Get history data for one or multiple devices of the same type for a
+        time range of any length (see HistoryBackfill).
+
+        Return a generator of (startTime, endTime, data) for each request window
+        as it completes. Completed windows are recorded in the checkpoint file
+        (if given) and skipped when the backfill is run again.
+
+        Ex:
+            for start, end, data in obj.device_history_backfill(1, t0, t1,
+                                        devIds=ids, checkpoint='backfill.ckpt'):
+                store(data)
+        """
+        backfill = HistoryBackfill(self, devTypeId, startTime, endTime, devIds=devIds,
+                                    sns=sns, checkpoint=checkpoint)
+
+        return backfill.run()
+
+
+    def fleet_real_time_data(self, devIds):
+        """
+        Get real time data for devices of any type.
+
+        Device ids are grouped by device type (see DeviceTopology), so a single
+        getDevRealKpi request is sent per type and per 100 devices.
+
+        On success, method return the merged 'data' of all requests.
+        """
+        result = []
+        for devTypeId, ids in self.topology.group_by_type(split_ids(devIds)).items():
+            result += self.device_real_time_data(devTypeId, devIds=ids) or []
+
+        return result
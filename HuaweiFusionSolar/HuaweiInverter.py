@@ -1,3 +1,4 @@
+import time
 
 from HuaweiFusionSolar import HuaweiFusionSolar
 
@@ -19,7 +20,7 @@ DEVICE_TYPE = {
 }
 
 class HuaweiInverter(HuaweiFusionSolar):
-    def __init__(self, client_name=None, client_pass=None, client_domain=None, device_type=None, device_id=None, log_file=None):
+    def __init__(self, client_name=None, client_pass=None, client_domain=None, device_type=None, device_id=None, log_file=None, **kwargs):
         """
         Connect to Huawei SmartPVMS
 
@@ -27,21 +28,31 @@ class HuaweiInverter(HuaweiFusionSolar):
             client_name     : Client username for SmartPVMS access.
             client_pass     : Client password for SmartPVMS access.
             client_domain   : Client domain name of the SmartPVMS system.
-            device_type     : Inverter device type ("string" | "residential")
+            device_type     : Inverter device type ("string" | "residential"),
+                              looked up in the device topology if None.
             device_id       : Inverter device id.
             log_file        : Filename to be used for logging
+            kwargs          : Options forwarded to HuaweiFusionSolar (pool
+                              sizes, quota, cache, history, json_codec,
+                              rollup).
         """
         self.device_id = device_id
         self.device_type = device_type
 
         # Validate device_type
-        if device_type not in DEVICE_TYPE:
+        if device_type is not None and device_type not in DEVICE_TYPE:
             raise ValueError("Invalid value for device type!")
 
-        self.device_type = DEVICE_TYPE[device_type]
-
         # Call constructor for HuaweiFusionSolar
-        super().__init__(client_name, client_pass, client_domain, log_file)
+        super().__init__(client_name, client_pass, client_domain, log_file, **kwargs)
+
+        if device_type is not None:
+            self.device_type = DEVICE_TYPE[device_type]
+        else:
+            self.device_type = self.topology.dev_type(device_id)
+            if self.device_type not in DEVICE_TYPE.values():
+                self.close()
+                raise ValueError("Device %s is not an inverter!" % device_id)
 
 
     def real_time_data(self):
@@ -83,3 +94,19 @@ class HuaweiInverter(HuaweiFusionSolar):
         data = self.real_time_data()
 
         return data[0]['dataItemMap']['active_power']
+
+
+    def daily_energy(self, collectTime=None):
+        """
+        Get inverter energy (kWh) of the day containing collectTime (default
+        now) from the rollup of the received samples, without any request.
+        Return None without rollup or samples of that day.
+        """
+        if self.rollup is None:
+            return None
+
+        if collectTime is None:
+            collectTime = int(time.time() * 1000)
+        rollup = self.rollup.daily(self.device_id, collectTime)
+
+        return None if rollup is None else rollup.energy
@@ -0,0 +1,149 @@
+import threading
+
+from HuaweiFusionSolar import HuaweiFusionSolar
+from HuaweiInverter import DEVICE_TYPE
+"""
+InverterFleet extracts real time information for many inverter devices through
+a single SmartPVMS session.
+
+Inverters are grouped by device type (see HuaweiInverter), so a poll sends one
+getDevRealKpi request per type and per 100 inverters instead of one request per
+inverter. Per inverter values are then read from the result of the last poll.
+"""
+
+
+class InverterFleet(HuaweiFusionSolar):
+    def __init__(self, client_name=None, client_pass=None, client_domain=None, inverters=None, log_file=None, **kwargs):
+        """
+        Connect to Huawei SmartPVMS
+
+        Parameters:
+            client_name     : Client username for SmartPVMS access.
+            client_pass     : Client password for SmartPVMS access.
+            client_domain   : Client domain name of the SmartPVMS system.
+            inverters       : Dictionary with inverter device id as key and
+                              device type ("string" | "residential" | None) as
+                              value, or list of inverter device ids. Device
+                              types set to None are looked up in the device
+                              topology.
+            log_file        : Filename to be used for logging
+            kwargs          : Options forwarded to HuaweiFusionSolar (pool
+                              sizes, quota, cache, history, json_codec,
+                              rollup).
+        """
+        if not isinstance(inverters, dict):
+            inverters = { device_id : None for device_id in (inverters or []) }
+
+        for device_type in inverters.values():
+            if device_type is not None and device_type not in DEVICE_TYPE:
+                raise ValueError("Invalid value for device type!")
+
+        # Call constructor for HuaweiFusionSolar
+        super().__init__(client_name, client_pass, client_domain, log_file, **kwargs)
+
+        self.groups = {}
+        self.data = {}
+        self.lock = threading.Lock()
+
+        try:
+            for device_id, device_type in inverters.items():
+                self.add(device_id, device_type)
+        except ValueError:
+            self.close()
+            raise
+
+
+    def add(self, device_id, device_type=None):
+        """
+        Add an inverter to the fleet.
+
+        Parameters:
+            device_id       : Inverter device id.
+            device_type     : Inverter device type ("string" | "residential"),
+                              looked up in the device topology if None.
+        """
+        if device_type is not None:
+            if device_type not in DEVICE_TYPE:
+                raise ValueError("Invalid value for device type!")
+            devTypeId = DEVICE_TYPE[device_type]
+        else:
+            devTypeId = self.topology.dev_type(device_id)
+            if devTypeId not in DEVICE_TYPE.values():
+                raise ValueError("Device %s is not an inverter!" % device_id)
+
+        with self.lock:
+            ids = self.groups.setdefault(devTypeId, [])
+            if str(device_id) not in ids:
+                ids.append(str(device_id))
+
+
+    def remove(self, device_id):
+        """
+        Remove an inverter from the fleet.
+        """
+        with self.lock:
+            for ids in self.groups.values():
+                if str(device_id) in ids:
+                    ids.remove(str(device_id))
+            self.data.pop(str(device_id), None)
+
+
+    def inverters(self):
+        """
+        Return the inverter device ids of the fleet.
+        """
+        with self.lock:
+            return [device_id for ids in self.groups.values() for device_id in ids]
+
+
+    def poll(self):
+        """
+        Get real time data of all inverters (one request per device type and
+        per 100 inverters).
+
+        Return a dictionary with inverter device id as key and its real time
+        data row as value.
+        """
+        with self.lock:
+            groups = { devTypeId : list(ids) for devTypeId, ids in self.groups.items() if ids }
+
+        data = {}
+        for devTypeId, ids in groups.items():
+            for row in super().device_real_time_data(devTypeId, devIds=ids) or []:
+                data[str(row['devId'])] = row
+
+        with self.lock:
+            self.data = data
+
+        return data
+
+
+    def real_time_data(self, device_id):
+        """
+        Get inverter real time data from the last poll (polls if the fleet was
+        never polled).
+        """
+        if not self.data:
+            self.poll()
+
+        return self.data.get(str(device_id))
+
+
+    def real_time_active_power(self, device_id):
+        """
+        Get real time inverter active power from the last poll.
+        """
+        data = self.real_time_data(device_id)
+
+        return None if data is None else data['dataItemMap']['active_power']
+
+
+    def active_power(self):
+        """
+        Get real time active power of all inverters from the last poll.
+        """
+        if not self.data:
+            self.poll()
+
+        return { device_id : row['dataItemMap']['active_power']
+                    for device_id, row in self.data.items() }
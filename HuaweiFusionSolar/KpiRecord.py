@@ -0,0 +1,167 @@
+import json
+"""
+KpiRecord is a compact representation of a single SmartPVMS KPI row
+(plant_*_data, device_*_data, ...).
+
+A row returned by SmartPVMS is a dictionary with a nested 'dataItemMap'
+dictionary, which costs several hundred bytes of dictionary overhead per row.
+Records use __slots__ instead:
+    - StationKpiRecord  stationCode, collectTime
+    - DeviceKpiRecord   devId, sn, collectTime
+
+Only a chosen subset of the 'dataItemMap' KPIs (the schema) is parsed into a
+tuple, whose layout is shared by all records of the schema. The remaining KPIs
+are kept as a compact JSON string and decoded on access.
+
+Ex:
+    schema = KpiSchema(["active_power", "day_cap"])
+    records = DeviceKpiRecord.from_payload(data, schema)
+    records[0]["active_power"]      # parsed
+    records[0]["temperature"]       # decoded lazily
+"""
+
+################################################################################
+# Separators of the JSON string with the KPIs not in the schema
+################################################################################
+REST_SEPARATORS = (",", ":")
+
+
+class KpiSchema(object):
+    __slots__ = ("kpis", "index")
+
+    def __init__(self, kpis):
+        """
+        Create a schema (KPIs parsed into record values).
+
+        Parameters:
+            kpis            : List of KPI names.
+        """
+        self.kpis = tuple(kpis)
+        self.index = { kpi : i for i, kpi in enumerate(self.kpis) }
+
+
+    @classmethod
+    def from_payload(cls, data):
+        """
+        Build a schema with all KPIs found in the rows of a request 'data'.
+        """
+        kpis = {}
+        for row in data or []:
+            for kpi in row.get('dataItemMap') or {}:
+                kpis[kpi] = None
+
+        return cls(kpis)
+
+
+class KpiRecord(object):
+    __slots__ = ("collectTime", "schema", "values", "rest")
+
+    # Row keys of the record slots (besides collectTime)
+    ROW_KEYS = ()
+
+    def __init__(self, row, schema):
+        """
+        Create a record from a request row.
+
+        Parameters:
+            row             : Dictionary returned by the request.
+            schema          : KpiSchema with the KPIs to parse.
+        """
+        for key in self.ROW_KEYS:
+            setattr(self, key, row.get(key))
+
+        self.collectTime = row.get('collectTime')
+        self.schema = schema
+
+        items = row.get('dataItemMap') or {}
+        self.values = tuple(items.get(kpi) for kpi in schema.kpis)
+
+        rest = { k : v for k, v in items.items() if k not in schema.index }
+        self.rest = json.dumps(rest, separators=REST_SEPARATORS) if rest else None
+
+
+    @classmethod
+    def from_payload(cls, data, schema=None):
+        """
+        Return the rows of a request 'data' as a list of records (all KPIs
+        parsed if no schema is given).
+        """
+        if schema is None:
+            schema = KpiSchema.from_payload(data)
+        elif not isinstance(schema, KpiSchema):
+            schema = KpiSchema(schema)
+
+        return [cls(row, schema) for row in data or []]
+
+
+    def __getitem__(self, kpi):
+        i = self.schema.index.get(kpi)
+        if i is not None:
+            return self.values[i]
+
+        if self.rest is not None:
+            rest = json.loads(self.rest)
+            if kpi in rest:
+                return rest[kpi]
+
+        raise KeyError(kpi)
+
+
+    def __contains__(self, kpi):
+        try:
+            self[kpi]
+        except KeyError:
+            return False
+
+        return True
+
+
+    def get(self, kpi, default=None):
+        """
+        Return the value of a KPI (default if not in the row).
+        """
+        try:
+            return self[kpi]
+        except KeyError:
+            return default
+
+
+    def data_item_map(self):
+        """
+        Return all KPIs of the record as a dictionary.
+        """
+        items = dict(zip(self.schema.kpis, self.values))
+        if self.rest is not None:
+            items.update(json.loads(self.rest))
+
+        return items
+
+
+    def to_dict(self):
+        """
+        Return the record as the row returned by the request.
+        """
+        row = { key : getattr(self, key) for key in self.ROW_KEYS
+                    if getattr(self, key) is not None }
+        if self.collectTime is not None:
+            row['collectTime'] = self.collectTime
+        row['dataItemMap'] = self.data_item_map()
+
+        return row
+
+
+    def __repr__(self):
+        keys = ", ".join("%s=%r" % (key, getattr(self, key)) for key in self.ROW_KEYS)
+        return "%s(%s, collectTime=%r)" % (type(self).__name__, keys, self.collectTime)
+
+
+class StationKpiRecord(KpiRecord):
+    __slots__ = ("stationCode",)
+
+    ROW_KEYS = ("stationCode",)
+
+
+class DeviceKpiRecord(KpiRecord):
+    __slots__ = ("devId", "sn")
+
+    ROW_KEYS = ("devId", "sn")
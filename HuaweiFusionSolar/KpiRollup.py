@@ -0,0 +1,269 @@
+import time
+import threading
+
+from datetime import datetime
+"""
+KpiRollup derives daily, monthly and yearly KPIs of plants/devices from their
+5 minutes active power samples (device_history_data, real time polls, ...), so
+reports do not spend plant/device *_daily/monthly/yearly_data calls.
+
+For each id and each day, month and year the rollup keeps:
+    - energy            active power integrated over time (kWh, trapezoids)
+    - peak_power        maximum active power (kW) and its collect time
+    - on_grid_hours     time with active power above ON_GRID_POWER (h)
+
+Each sample updates the three periods it belongs to in constant time. Samples
+must be added in collect time order per id (older or duplicated samples are
+ignored); intervals longer than max_gap (missing data) are not integrated.
+
+Local values drift from the SmartPVMS ones when samples are missing, so they
+can be cross-checked occasionally (at most every check_interval) against the
+server daily energy of the month (device_daily_data, one request per device
+type, so samples are added with their device type).
+
+A HuaweiFusionSolar client created with a rollup adds the samples of its
+device_real_time_data and device_history_data answers.
+
+Periods are computed in the plants timezone (tz, default local time).
+"""
+
+################################################################################
+# Rollup periods
+################################################################################
+PERIOD_DAY = "day"
+PERIOD_MONTH = "month"
+PERIOD_YEAR = "year"
+
+ROLLUP_PERIODS = (PERIOD_DAY, PERIOD_MONTH, PERIOD_YEAR)
+
+################################################################################
+# Rollup config.
+################################################################################
+POWER_KPI = "active_power"          # Sample KPI with active power (kW)
+ENERGY_KPI = "product_power"        # Server daily KPI with energy (kWh)
+ON_GRID_POWER = 0.0                 # Active power (kW) above which on grid
+SAMPLE_MAX_GAP = 15 * 60 * 1000     # Longest integrated interval (ms)
+CHECK_INTERVAL = 7 * 24 * 60 * 60   # Minimum time between cross-checks (seconds)
+CHECK_TOLERANCE = 0.05              # Relative energy deviation reported
+
+
+class Rollup(object):
+    __slots__ = ("energy", "peak_power", "peak_time", "on_grid_hours", "samples")
+
+    def __init__(self):
+        self.energy = 0.0
+        self.peak_power = None
+        self.peak_time = None
+        self.on_grid_hours = 0.0
+        self.samples = 0
+
+
+    def to_dict(self):
+        return { "energy" : self.energy, "peak_power" : self.peak_power,
+                "peak_time" : self.peak_time, "on_grid_hours" : self.on_grid_hours,
+                "samples" : self.samples }
+
+
+class KpiRollup(object):
+    def __init__(self, tz=None, power_kpi=POWER_KPI, max_gap=SAMPLE_MAX_GAP,
+                check_interval=CHECK_INTERVAL, check_tolerance=CHECK_TOLERANCE):
+        """
+        Create a rollup engine.
+
+        Parameters:
+            tz              : Plants timezone (datetime.tzinfo, default local)
+            power_kpi       : 'dataItemMap' KPI with the active power (kW)
+            max_gap         : Longest interval between samples integrated (ms)
+            check_interval  : Minimum time between cross-checks (seconds)
+            check_tolerance : Relative energy deviation reported by cross-checks
+        """
+        self.tz = tz
+        self.power_kpi = power_kpi
+        self.max_gap = max_gap
+        self.check_interval = check_interval
+        self.check_tolerance = check_tolerance
+        self.lock = threading.Lock()
+
+        # rollups[period][(id, period start)] = Rollup
+        self.rollups = { period : {} for period in ROLLUP_PERIODS }
+        # Last (collectTime, power) sample and device type of each id
+        self.last = {}
+        self.types = {}
+        self.last_check = None
+
+
+    def period_starts(self, collectTime):
+        """
+        Return the start (ms) of the day, month and year containing collectTime.
+        """
+        day = datetime.fromtimestamp(collectTime / 1000, self.tz) \
+                      .replace(hour=0, minute=0, second=0, microsecond=0)
+        month = day.replace(day=1)
+        year = month.replace(month=1)
+
+        return tuple(int(t.timestamp() * 1000) for t in (day, month, year))
+
+
+    def period_start(self, period, collectTime):
+        """
+        Return the start (ms) of the day/month/year containing collectTime.
+        """
+        return self.period_starts(collectTime)[ROLLUP_PERIODS.index(period)]
+
+
+    def add(self, id, collectTime, power, devTypeId=None):
+        """
+        Add an active power sample (kW) of a plant/device (of type devTypeId).
+        """
+        id = str(id)
+        try:
+            power = float(power)
+        except (TypeError, ValueError):
+            return
+
+        with self.lock:
+            if devTypeId is not None:
+                self.types[id] = devTypeId
+
+            last = self.last.get(id)
+            if last is not None and collectTime <= last[0]:
+                return
+
+            # Energy and on grid time of the interval since the last sample
+            hours = 0.0
+            if last is not None and collectTime - last[0] <= self.max_gap:
+                hours = (collectTime - last[0]) / 3600000
+
+            self.last[id] = (collectTime, power)
+
+            for period, start in zip(ROLLUP_PERIODS, self.period_starts(collectTime)):
+                key = (id, start)
+                rollup = self.rollups[period].get(key)
+                if rollup is None:
+                    rollup = self.rollups[period][key] = Rollup()
+
+                rollup.samples += 1
+                if hours:
+                    rollup.energy += (last[1] + power) / 2 * hours
+                    if power > ON_GRID_POWER:
+                        rollup.on_grid_hours += hours
+                if rollup.peak_power is None or power > rollup.peak_power:
+                    rollup.peak_power = power
+                    rollup.peak_time = collectTime
+
+
+    def add_rows(self, rows, id_key="devId", devTypeId=None):
+        """
+        Add the samples of the rows returned by a request (dictionaries or
+        KpiRecord), ex: device_history_data or device_real_time_data of
+        devices of type devTypeId.
+        """
+        for row in sorted(rows or [], key=lambda r: self.__field(r, 'collectTime') or 0):
+            collectTime = self.__field(row, 'collectTime') or int(time.time() * 1000)
+            if isinstance(row, dict):
+                power = (row.get('dataItemMap') or {}).get(self.power_kpi)
+            else:
+                power = row.get(self.power_kpi)
+
+            self.add(self.__field(row, id_key), collectTime, power, devTypeId)
+
+
+    def __field(self, row, key):
+        return row.get(key) if isinstance(row, dict) else getattr(row, key, None)
+
+
+    def get(self, period, id, collectTime):
+        """
+        Return the Rollup of the day/month/year containing collectTime (None if
+        no sample was added).
+        """
+        with self.lock:
+            return self.rollups[period].get((str(id), self.period_start(period, collectTime)))
+
+
+    def daily(self, id, collectTime):
+        return self.get(PERIOD_DAY, id, collectTime)
+
+
+    def monthly(self, id, collectTime):
+        return self.get(PERIOD_MONTH, id, collectTime)
+
+
+    def yearly(self, id, collectTime):
+        return self.get(PERIOD_YEAR, id, collectTime)
+
+
+    def prune(self, before):
+        """
+        Drop the daily rollups of days starting before the given time (ms).
+        """
+        with self.lock:
+            days = self.rollups[PERIOD_DAY]
+            for key in [key for key in days if key[1] < before]:
+                del days[key]
+
+
+    def check_due(self):
+        """
+        Return True if a cross-check is due.
+        """
+        return self.last_check is None or time.time() - self.last_check >= self.check_interval
+
+
+    def __check_groups(self, devTypeId, devIds):
+        """
+        Return a dictionary with device type as key and the ids to cross-check
+        as value.
+        """
+        if devIds is not None:
+            if devTypeId is None:
+                raise ValueError("devTypeId must be set with devIds!")
+            return { devTypeId : list(devIds) }
+
+        groups = {}
+        with self.lock:
+            for id, type_id in sorted(self.types.items()):
+                if devTypeId is None or type_id == devTypeId:
+                    groups.setdefault(type_id, []).append(id)
+
+        return groups
+
+
+    def cross_check(self, client, devTypeId, collectTime, devIds=None, force=False):
+        """
+        Compare the local daily energy of the month containing collectTime with
+        the server one, if a check is due.
+
+        Without devIds, the devices with samples added with a device type are
+        checked (only those of devTypeId, or all if devTypeId is None) with one
+        device_daily_data request per device type. The check is only recorded
+        once all requests succeeded.
+
+        Return None if no check was done, otherwise a dictionary with
+        (device id, day start) as key and (local, server) energy as value for
+        the days deviating more than check_tolerance.
+        """
+        if not force and not self.check_due():
+            return None
+
+        groups = self.__check_groups(devTypeId, devIds)
+
+        rows = []
+        for type_id, ids in groups.items():
+            rows.extend(client.device_daily_data(type_id, collectTime, devIds=ids) or [])
+
+        self.last_check = time.time()
+
+        deviations = {}
+        for row in rows:
+            server = (row.get('dataItemMap') or {}).get(ENERGY_KPI)
+            rollup = self.daily(row.get('devId'), row.get('collectTime'))
+            if server is None or rollup is None:
+                continue
+
+            server = float(server)
+            if abs(rollup.energy - server) > self.check_tolerance * max(abs(server), 1e-9):
+                key = (str(row.get('devId')), self.period_start(PERIOD_DAY, row.get('collectTime')))
+                deviations[key] = (rollup.energy, server)
+
+        return deviations
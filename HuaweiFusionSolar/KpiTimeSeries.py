@@ -0,0 +1,190 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+"""
+KpiTimeSeries is a columnar representation of SmartPVMS KPI results
+(device_history_data, plant_*_data, ...).
+
+Instead of a list of dictionaries with a nested 'dataItemMap', rows are stored
+as typed NumPy columns:
+    - ids           plant/device id of each row (string)
+    - collect_time  collect time in miliseconds (int64)
+    - columns       one masked float64 array per KPI (null values are masked)
+
+Rows are sorted by id and collect time, so selecting a device or a time range
+is a binary search and aggregations (sum, mean, resample) are vectorized.
+
+Requires NumPy.
+"""
+
+################################################################################
+# Row keys identifying the plant/device (in order of preference)
+################################################################################
+ID_KEYS = ("devId", "stationCode", "sn")
+
+################################################################################
+# Resample aggregations
+################################################################################
+AGGREGATIONS = ("sum", "mean", "min", "max")
+
+
+class KpiTimeSeries(object):
+    def __init__(self, ids, collect_time, columns):
+        """
+        Create a time series from columns (rows sorted by id and time).
+
+        Parameters:
+            ids             : Array with plant/device id of each row.
+            collect_time    : Array with collect time (ms) of each row.
+            columns         : Dictionary with a masked array per KPI.
+        """
+        if np is None:
+            raise ImportError("KpiTimeSeries requires numpy!")
+
+        self.ids = ids
+        self.collect_time = collect_time
+        self.columns = columns
+
+
+    @classmethod
+    def from_payload(cls, data, kpis=None, id_key=None):
+        """
+        Build a time series from the 'data' returned by a KPI request.
+
+        Parameters:
+            data            : List of rows returned by the request.
+            kpis            : KPI names to keep (default all).
+            id_key          : Row key with the id (default first of ID_KEYS).
+        """
+        if np is None:
+            raise ImportError("KpiTimeSeries requires numpy!")
+
+        data = data or []
+
+        if id_key is None:
+            id_key = next((k for k in ID_KEYS if data and k in data[0]), ID_KEYS[0])
+
+        if kpis is None:
+            kpis = []
+            for row in data:
+                for kpi in row.get('dataItemMap', {}):
+                    if kpi not in kpis:
+                        kpis.append(kpi)
+
+        ids = np.array([str(row.get(id_key)) for row in data], dtype=str)
+        collect_time = np.array([row.get('collectTime', 0) for row in data], dtype=np.int64)
+        order = np.lexsort((collect_time, ids))
+
+        columns = {}
+        for kpi in kpis:
+            values = np.zeros(len(data), dtype=np.float64)
+            mask = np.zeros(len(data), dtype=bool)
+            for i, row in enumerate(data):
+                value = row.get('dataItemMap', {}).get(kpi)
+                try:
+                    values[i] = float(value)
+                except (TypeError, ValueError):
+                    mask[i] = True
+
+            columns[kpi] = np.ma.MaskedArray(values[order], mask=mask[order])
+
+        return cls(ids[order], collect_time[order], columns)
+
+
+    def __len__(self):
+        return len(self.collect_time)
+
+
+    def kpis(self):
+        """
+        Return the KPI names.
+        """
+        return list(self.columns)
+
+
+    def devices(self):
+        """
+        Return the distinct ids.
+        """
+        return [str(i) for i in np.unique(self.ids)]
+
+
+    def __take(self, index):
+        return KpiTimeSeries(self.ids[index], self.collect_time[index],
+                            { k : v[index] for k, v in self.columns.items() })
+
+
+    def select(self, ids=None, start=None, end=None):
+        """
+        Return the rows of the given ids with start <= collect_time < end.
+        """
+        if ids is None:
+            index = np.arange(len(self))
+        else:
+            ids = [str(i) for i in ([ids] if isinstance(ids, (str, int)) else ids)]
+            index = np.concatenate([np.arange(np.searchsorted(self.ids, i, 'left'),
+                                            np.searchsorted(self.ids, i, 'right'))
+                                    for i in sorted(ids)] or [np.arange(0)])
+
+        keep = np.ones(len(index), dtype=bool)
+        if start is not None:
+            keep &= self.collect_time[index] >= start
+        if end is not None:
+            keep &= self.collect_time[index] < end
+
+        return self.__take(index[keep])
+
+
+    def sum(self, kpi):
+        """
+        Return the sum of a KPI (null values ignored).
+        """
+        return float(self.columns[kpi].sum())
+
+
+    def mean(self, kpi):
+        """
+        Return the mean of a KPI (None if all values are null).
+        """
+        value = self.columns[kpi].mean()
+
+        return None if value is np.ma.masked else float(value)
+
+
+    def resample(self, period, how="mean"):
+        """
+        Aggregate rows of each id in buckets of period miliseconds.
+
+        Return a new time series with one row per (id, bucket), collect_time
+        set to the bucket start. Buckets without values are null.
+        """
+        if how not in AGGREGATIONS:
+            raise ValueError("Invalid value for aggregation!")
+
+        if len(self) == 0:
+            return self
+
+        bucket = self.collect_time // period * period
+
+        # Rows are sorted by id and time, so each group is contiguous
+        change = np.ones(len(self), dtype=bool)
+        change[1:] = (self.ids[1:] != self.ids[:-1]) | (bucket[1:] != bucket[:-1])
+        starts = np.flatnonzero(change)
+
+        columns = {}
+        for kpi, column in self.columns.items():
+            count = np.add.reduceat((~np.ma.getmaskarray(column)).astype(np.int64), starts)
+
+            if how in ("sum", "mean"):
+                values = np.add.reduceat(column.filled(0.0), starts)
+                if how == "mean":
+                    values = values / np.maximum(count, 1)
+            elif how == "min":
+                values = np.minimum.reduceat(column.filled(np.inf), starts)
+            else:
+                values = np.maximum.reduceat(column.filled(-np.inf), starts)
+
+            columns[kpi] = np.ma.MaskedArray(values, mask=count == 0)
+
+        return KpiTimeSeries(self.ids[starts], bucket[starts], columns)
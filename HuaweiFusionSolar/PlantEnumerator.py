@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from QuotaScheduler import QuotaExceededError
+"""
+PlantEnumerator yields all plants of a SmartPVMS account (plant_list) without
+looping over pages one by one.
+
+Page 1 is requested first to learn the number of pages (pageCount), then the
+following pages are requested concurrently, keeping at most prefetch pages in
+flight. Plants are yielded in page order as soon as each page arrives.
+
+The number of pages requested is capped to the remaining plant_list budget
+(daily quota). When the budget runs out before the last page,
+QuotaExceededError is raised after the plants of the fetched pages have been
+yielded; next_page then holds the page to resume from (firstPage).
+"""
+
+################################################################################
+# Enumeration config.
+################################################################################
+PLANT_PREFETCH = 4                  # Maximum pages requested concurrently
+
+
+class PlantEnumerator(object):
+    def __init__(self, client, startTime=None, endTime=None, firstPage=1, prefetch=PLANT_PREFETCH):
+        """
+        Create a plant enumerator.
+
+        Parameters:
+            client          : HuaweiFusionSolar client.
+            startTime       : Grid connected start time in miliseconds.
+            endTime         : Grid connected end time in miliseconds.
+            firstPage       : Page to start (or resume) from.
+            prefetch        : Maximum pages requested concurrently.
+        """
+        if firstPage < 1:
+            raise ValueError("Invalid value for first page!")
+
+        self.client = client
+        self.startTime = startTime
+        self.endTime = endTime
+        self.prefetch = max(prefetch, 1)
+
+        self.next_page = firstPage
+        self.page_count = None
+        self.total = None
+
+
+    def __fetch(self, pageNo):
+        return self.client.plant_list(pageNo, self.startTime, self.endTime) or {}
+
+
+    def __budget(self):
+        """
+        Return the number of plant_list calls left (None if unlimited).
+        """
+        return self.client.quota_remaining(self.client.plant_list.__name__)
+
+
+    def run(self):
+        """
+        Fetch the remaining pages, yielding each plant (the 'list' entries of
+        plant_list) in page order.
+        """
+        page = self.__fetch(self.next_page)
+        self.page_count = int(page.get('pageCount', 1))
+        self.total = page.get('total')
+
+        yield from page.get('list', [])
+        self.next_page += 1
+
+        if self.next_page > self.page_count:
+            return
+
+        # Do not request more pages than the daily budget allows
+        last_page = self.page_count
+        budget = self.__budget()
+        if budget is not None:
+            last_page = min(last_page, self.next_page + budget - 1)
+
+        pages = iter(range(self.next_page, last_page + 1))
+
+        executor = ThreadPoolExecutor(max_workers=self.prefetch)
+        try:
+            running = []
+            for pageNo in pages:
+                running.append(executor.submit(self.__fetch, pageNo))
+                if len(running) >= self.prefetch:
+                    break
+
+            while running:
+                page = running.pop(0).result()
+
+                # Keep prefetch pages in flight while the caller consumes plants
+                pageNo = next(pages, None)
+                if pageNo is not None:
+                    running.append(executor.submit(self.__fetch, pageNo))
+
+                yield from page.get('list', [])
+                self.next_page += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.next_page <= self.page_count:
+            raise QuotaExceededError("%s: quota exceeded (resume from page %d)" %
+                                    (self.client.plant_list.__name__, self.next_page))
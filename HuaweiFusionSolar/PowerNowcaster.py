@@ -0,0 +1,137 @@
+import math
+import time
+import threading
+
+from datetime import datetime
+"""
+PowerNowcaster estimates the active power of an inverter between SmartPVMS
+refreshes (every 5 minutes) without extra API calls.
+
+It is a streaming double exponential smoothing (Holt) model:
+    - level         EWMA of the active power
+    - trend         EWMA of the level change per refresh interval
+    - variance      EWMA of the squared one step prediction error
+
+nowcast(t) extrapolates level + trend to t and returns a confidence band that
+widens with the time since the last reading. The model can be seeded with the
+5 minutes samples of the day (device_history_data) so it is warm at startup.
+
+Readings are accepted at any time; the smoothing is scaled with the number of
+refresh intervals elapsed since the previous reading.
+"""
+
+################################################################################
+# Nowcaster config.
+################################################################################
+NOWCAST_ALPHA = 0.5                 # Level smoothing factor
+NOWCAST_BETA = 0.3                  # Trend smoothing factor
+NOWCAST_GAMMA = 0.2                 # Error variance smoothing factor
+NOWCAST_INTERVAL = 5 * 60           # SmartPVMS refresh period (seconds)
+NOWCAST_Z = 1.645                   # Band width in standard deviations (90%)
+POWER_KPI = "active_power"          # History KPI with active power (kW)
+
+
+class PowerNowcaster(object):
+    def __init__(self, alpha=NOWCAST_ALPHA, beta=NOWCAST_BETA, gamma=NOWCAST_GAMMA,
+                interval=NOWCAST_INTERVAL, z=NOWCAST_Z):
+        """
+        Create a nowcaster.
+
+        Parameters:
+            alpha           : Level smoothing factor (0, 1]
+            beta            : Trend smoothing factor [0, 1]
+            gamma           : Error variance smoothing factor (0, 1]
+            interval        : SmartPVMS refresh period (seconds)
+            z               : Confidence band width in standard deviations
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.interval = interval
+        self.z = z
+        self.lock = threading.Lock()
+
+        self.level = None
+        self.trend = 0.0
+        self.variance = 0.0
+        self.last_time = None
+
+
+    def update(self, power, t=None):
+        """
+        Add an active power reading (kW) taken at t (epoch seconds, default
+        now). Readings older than the last one are ignored.
+        """
+        t = time.time() if t is None else t
+        try:
+            power = float(power)
+        except (TypeError, ValueError):
+            return
+
+        with self.lock:
+            if self.level is None:
+                self.level, self.last_time = power, t
+                return
+
+            if t <= self.last_time:
+                return
+
+            steps = (t - self.last_time) / self.interval
+            predicted = self.level + self.trend * steps
+            error = power - predicted
+
+            level = self.alpha * power + (1 - self.alpha) * predicted
+            self.trend = self.beta * (level - self.level) / steps + (1 - self.beta) * self.trend
+            self.level = level
+            self.variance = self.gamma * error * error + (1 - self.gamma) * self.variance
+            self.last_time = t
+
+
+    def seed(self, rows, power_kpi=POWER_KPI):
+        """
+        Add the samples of the rows returned by device_history_data
+        (dictionaries or DeviceKpiRecord).
+        """
+        samples = []
+        for row in rows or []:
+            if isinstance(row, dict):
+                collectTime = row.get('collectTime')
+                power = (row.get('dataItemMap') or {}).get(power_kpi)
+            else:
+                collectTime, power = row.collectTime, row.get(power_kpi)
+            if collectTime is not None:
+                samples.append((collectTime / 1000, power))
+
+        for t, power in sorted(samples, key=lambda s: s[0]):
+            self.update(power, t)
+
+
+    def seed_from_inverter(self, inverter, t=None):
+        """
+        Seed with the samples of the day of t (default now) of a HuaweiInverter
+        (one device_history_data request).
+        """
+        t = time.time() if t is None else t
+        start = datetime.fromtimestamp(t).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        rows = inverter.device_history_data(inverter.device_type, int(start.timestamp() * 1000),
+                                            int(t * 1000), devIds=inverter.device_id)
+        self.seed(rows)
+
+
+    def nowcast(self, t=None):
+        """
+        Return (expected, low, high) active power (kW) at t (epoch seconds,
+        default now), or (None, None, None) before the first reading.
+        """
+        t = time.time() if t is None else t
+
+        with self.lock:
+            if self.level is None:
+                return None, None, None
+
+            steps = max(t - self.last_time, 0) / self.interval
+            expected = max(self.level + self.trend * steps, 0.0)
+            band = self.z * math.sqrt(self.variance * (1 + steps))
+
+        return expected, max(expected - band, 0.0), expected + band
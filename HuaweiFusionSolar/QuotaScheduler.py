@@ -0,0 +1,211 @@
+import math
+import time
+import threading
+
+from collections import deque
+"""
+QuotaScheduler keeps track of the SmartPVMS API call budgets of a user.
+
+Each endpoint has a maximum number of calls in a time window (see the
+HuaweiFusionSolar method docstrings), scaled with the number of plants or
+devices of the account:
+
+    limit = Roundup(nr_plants / 100) x per_100 + extra
+    limit = Sum (Roundup(nr_devices of same type / 100)) x per_100 + extra
+
+Calls are recorded in a sliding window per endpoint. A call that would exceed
+the budget is either delayed until a slot frees up (QUOTA_WAIT) or rejected
+with QuotaExceededError (QUOTA_REJECT). Calls that would have to wait longer
+than max_wait are always rejected.
+
+Budgets are per user, so clients of the same account should share one
+scheduler.
+"""
+
+################################################################################
+# Quota windows (seconds)
+################################################################################
+WINDOW_5_MIN = 5 * 60
+WINDOW_DAY = 24 * 60 * 60
+
+################################################################################
+# Quota units
+################################################################################
+PLANTS = "plants"
+DEVICES = "devices"
+
+################################################################################
+# Quota per method: (window, unit, per_100, extra)
+################################################################################
+QUOTAS = {
+    "plant_list" : (WINDOW_DAY, PLANTS, 10, 25),
+    "plant_real_time_data" : (WINDOW_5_MIN, PLANTS, 1, 0),
+    "plant_hourly_data" : (WINDOW_DAY, PLANTS, 1, 24),
+    "plant_daily_data" : (WINDOW_DAY, PLANTS, 1, 24),
+    "plant_monthly_data" : (WINDOW_DAY, PLANTS, 1, 24),
+    "plant_yearly_data" : (WINDOW_DAY, PLANTS, 1, 24),
+    "device_list" : (WINDOW_DAY, PLANTS, 1, 24),
+    "device_real_time_data" : (WINDOW_5_MIN, DEVICES, 1, 0),
+    "device_history_data" : (WINDOW_DAY, DEVICES, 1, 24),
+    "device_daily_data" : (WINDOW_DAY, DEVICES, 1, 24),
+    "device_monthly_data" : (WINDOW_DAY, DEVICES, 1, 24),
+    "device_yearly_data" : (WINDOW_DAY, DEVICES, 1, 24),
+}
+
+################################################################################
+# Quota policies
+################################################################################
+QUOTA_WAIT = "wait"                 # Delay calls until budget is available
+QUOTA_REJECT = "reject"             # Reject calls exceeding the budget
+QUOTA_MAX_WAIT = WINDOW_5_MIN       # Maximum delay (seconds) for QUOTA_WAIT
+
+
+class QuotaExceededError(ValueError):
+    pass
+
+
+class QuotaScheduler(object):
+    def __init__(self, nr_plants=1, nr_devices=1, policy=QUOTA_WAIT, max_wait=QUOTA_MAX_WAIT):
+        """
+        Create a quota scheduler.
+
+        Parameters:
+            nr_plants       : Number of plants of the account.
+            nr_devices      : Number of devices of the account, either as a
+                              dictionary with device type as key or as an
+                              integer (devices of a single type, counted
+                              for the first device type observed).
+            policy          : Action for calls exceeding the budget
+                              (QUOTA_WAIT | QUOTA_REJECT)
+            max_wait        : Maximum delay (seconds) of a call for QUOTA_WAIT
+        """
+        if policy not in (QUOTA_WAIT, QUOTA_REJECT):
+            raise ValueError("Invalid value for quota policy!")
+
+        self.policy = policy
+        self.max_wait = max_wait
+        if not isinstance(nr_devices, dict):
+            nr_devices = { None : nr_devices }
+
+        self.units = { PLANTS : nr_plants, DEVICES : dict(nr_devices) }
+        self.calls = { name : deque() for name in QUOTAS }
+        self.lock = threading.Lock()
+
+
+    def observe(self, name, nr_ids, devTypeId=None):
+        """
+        Grow the number of plants/devices (of devTypeId) of the account if a
+        request for name carries more ids than currently known.
+        """
+        if name not in QUOTAS:
+            return
+
+        unit = QUOTAS[name][1]
+        with self.lock:
+            if unit == PLANTS:
+                self.units[PLANTS] = max(self.units[PLANTS], nr_ids)
+            else:
+                devices = self.units[DEVICES]
+                # The untyped count (devices of a single type) is the count of
+                # the first device type observed
+                if devTypeId is not None and None in devices and \
+                        not any(t is not None for t in devices):
+                    devices[devTypeId] = devices.pop(None)
+                devices[devTypeId] = max(devices.get(devTypeId, 0), nr_ids)
+
+
+    def __nr_units(self, unit):
+        """
+        Return the number of 100 plants/devices units of the account.
+        """
+        if unit == PLANTS:
+            return math.ceil(self.units[PLANTS] / 100)
+
+        # Devices are counted per type
+        return sum(math.ceil(n / 100) for n in self.units[DEVICES].values())
+
+
+    def limit(self, name):
+        """
+        Return the maximum number of calls of name per window (None if the
+        method has no quota).
+        """
+        if name not in QUOTAS:
+            return None
+
+        window, unit, per_100, extra = QUOTAS[name]
+
+        return self.__nr_units(unit) * per_100 + extra
+
+
+    def __expire(self, name, now):
+        """
+        Drop the calls of name that are out of the window (lock held).
+        """
+        window = QUOTAS[name][0]
+        calls = self.calls[name]
+        while calls and calls[0] <= now - window:
+            calls.popleft()
+
+
+    def remaining(self, name=None):
+        """
+        Return the remaining number of calls of name in the current window
+        (None if the method has no quota, budgets() if name is None).
+        """
+        if name is None:
+            return self.budgets()
+
+        if name not in QUOTAS:
+            return None
+
+        with self.lock:
+            self.__expire(name, time.time())
+            return max(self.limit(name) - len(self.calls[name]), 0)
+
+
+    def budgets(self):
+        """
+        Return the remaining number of calls for each method.
+        """
+        return { name : self.remaining(name) for name in QUOTAS }
+
+
+    def try_acquire(self, name):
+        """
+        Record a call of name if the budget allows it and return None,
+        otherwise return the delay (seconds) until a call frees up. Calls to be
+        rejected according to the policy raise QuotaExceededError.
+        """
+        if name not in QUOTAS:
+            return None
+
+        with self.lock:
+            now = time.time()
+            self.__expire(name, now)
+
+            calls = self.calls[name]
+            if len(calls) < self.limit(name):
+                calls.append(now)
+                return None
+
+            delay = calls[0] + QUOTAS[name][0] - now
+
+        if self.policy == QUOTA_REJECT or delay > self.max_wait:
+            raise QuotaExceededError("%s: quota exceeded (retry in %d s)" %
+                                    (name, math.ceil(delay)))
+
+        return delay
+
+
+    def acquire(self, name):
+        """
+        Record a call of name, delaying or rejecting it according to the policy
+        when the budget is exhausted.
+        """
+        while True:
+            delay = self.try_acquire(name)
+            if delay is None:
+                return
+
+            time.sleep(delay)
@@ -0,0 +1,168 @@
+import math
+import time
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future
+"""
+ResponseCache keeps the 'data' of SmartPVMS responses for a limited time.
+
+SmartPVMS refreshes real time KPIs every 5 minutes, so repeated requests in
+that interval return the same data while spending quota and latency. Entries
+are keyed by method name and normalized request parameters (ids order does not
+matter) and expire after the method TTL. The cache is bounded (least recently
+used entries are evicted first) and concurrent misses for the same key result
+in a single upstream request.
+
+Real time entries expire at the next refresh boundary (the next multiple of
+the TTL since the epoch, the grid AdaptivePoller aligns its polls to) rather
+than a TTL after the fetch, so a poll just after each refresh never gets the
+previous value.
+
+Cached data is shared between callers and must be treated as read-only.
+"""
+
+################################################################################
+# Default TTL per method (seconds). Methods not listed are not cached.
+################################################################################
+CACHE_TTL = {
+    "plant_real_time_data" : 300,
+    "device_real_time_data" : 300,
+}
+
+################################################################################
+# Methods whose entries expire at the next multiple of their TTL
+################################################################################
+CACHE_ALIGNED = ("plant_real_time_data", "device_real_time_data")
+
+CACHE_MAX_SIZE = 1024               # Maximum number of cached responses
+
+################################################################################
+# Request parameters holding comma separated ids
+################################################################################
+ID_KEYS = ("stationCodes", "devIds", "sns")
+
+
+class ResponseCache(object):
+    def __init__(self, ttl=None, max_size=CACHE_MAX_SIZE, aligned=CACHE_ALIGNED):
+        """
+        Create a response cache.
+
+        Parameters:
+            ttl             : Dictionary with TTL (seconds) per method name,
+                              overriding CACHE_TTL (0 or None disables a method)
+            max_size        : Maximum number of cached responses
+            aligned         : Method names whose entries expire at the next
+                              multiple of their TTL (refresh boundary)
+        """
+        self.ttl = dict(CACHE_TTL)
+        if ttl is not None:
+            self.ttl.update(ttl)
+
+        self.max_size = max_size
+        self.aligned = set(aligned)
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def __key(self, name, data):
+        """
+        Build the cache key from method name and request parameters.
+        """
+        params = []
+        for key in sorted(data):
+            value = data[key]
+            if key in ID_KEYS and isinstance(value, str):
+                value = ','.join(sorted(value.split(',')))
+            params.append((key, value))
+
+        return (name, tuple(params))
+
+
+    def __evict(self, now):
+        """
+        Make room for a new entry (lock held): drop expired entries first,
+        then the least recently used ones.
+        """
+        if len(self.entries) < self.max_size:
+            return
+
+        for key in [k for k, (expire, _) in self.entries.items() if expire <= now]:
+            del self.entries[key]
+
+        while len(self.entries) >= self.max_size:
+            self.entries.popitem(last=False)
+
+
+    def __expiry(self, name, ttl, now):
+        """
+        Return the expiry time of an entry of name fetched at now.
+        """
+        if name in self.aligned:
+            return (math.floor(now / ttl) + 1) * ttl
+
+        return now + ttl
+
+
+    def get(self, name, data, fetch):
+        """
+        Return the cached 'data' for the request or call fetch() to get it.
+        """
+        ttl = self.ttl.get(name)
+        if not ttl:
+            return fetch()
+
+        key = self.__key(name, data)
+
+        with self.lock:
+            now = time.time()
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return entry[1]
+
+                del self.entries[key]
+
+            # Coalesce concurrent misses for the same key
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self.pending[key] = future
+            else:
+                self.hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except Exception as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            now = time.time()
+            self.__evict(now)
+            self.entries[key] = (self.__expiry(name, ttl, now), value)
+            del self.pending[key]
+
+        future.set_result(value)
+
+        return value
+
+
+    def clear(self):
+        """
+        Drop all cached responses.
+        """
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,95 @@
+import sys
+import time
+import threading
+sys.path.append('../HuaweiFusionSolar')
+
+import ResponseCache as cache_module
+from ResponseCache import ResponseCache
+
+# Offline: entries expire on a simulated clock and requests are answered by a
+# local fetch function (no SmartPVMS access needed)
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+clock = Clock(1700000000.0)
+cache_module.time = clock
+
+fetched = []
+
+def fetch(value, wait=None):
+    def request():
+        if wait is not None:
+            wait.wait(5)
+        fetched.append(value)
+        return value
+    return request
+
+
+obj = ResponseCache(ttl={ "device_history_data" : 60 })
+
+# Methods without TTL are not cached
+assert obj.get('device_list', {}, fetch(1)) == 1
+assert obj.get('device_list', {}, fetch(2)) == 2
+
+# Ids order does not matter
+data = { "devTypeId" : 1, "devIds" : "1,2" }
+assert obj.get('device_real_time_data', data, fetch("a")) == "a"
+assert obj.get('device_real_time_data', { "devTypeId" : 1, "devIds" : "2,1" }, fetch("b")) == "a"
+assert obj.get('device_real_time_data', { "devTypeId" : 38, "devIds" : "1,2" }, fetch("c")) == "c"
+print("hits: %d, misses: %d" % (obj.hits, obj.misses))
+assert (obj.hits, obj.misses) == (1, 2)
+
+# Real time entries expire at the next refresh boundary (multiple of the TTL)
+boundary = (int(clock.now) // 300 + 1) * 300
+clock.now = boundary - 1
+assert obj.get('device_real_time_data', data, fetch("d")) == "a"
+clock.now = boundary
+assert obj.get('device_real_time_data', data, fetch("e")) == "e"
+clock.now = boundary + 299
+assert obj.get('device_real_time_data', data, fetch("f")) == "e"
+
+# Other entries expire a TTL after they were fetched
+data = { "devTypeId" : 1, "devIds" : "1", "startTime" : 0, "endTime" : 1 }
+assert obj.get('device_history_data', data, fetch("g")) == "g"
+clock.now += 59
+assert obj.get('device_history_data', data, fetch("h")) == "g"
+clock.now += 1
+assert obj.get('device_history_data', data, fetch("i")) == "i"
+
+# Concurrent misses for the same key result in a single request
+del fetched[:]
+wait = threading.Event()
+clock.now += 300
+results = []
+data = { "devTypeId" : 1, "devIds" : "3" }
+threads = [threading.Thread(target=lambda: results.append(obj.get('device_real_time_data', data, fetch("j", wait))))
+                for i in range(10)]
+for thread in threads:
+    thread.start()
+time.sleep(0.2)
+wait.set()
+for thread in threads:
+    thread.join()
+print("results: %s, requests: %d" % (results, len(fetched)))
+assert results == ["j"] * 10 and fetched == ["j"]
+
+# Request errors are raised and not cached
+def error():
+    raise ValueError("request error")
+try:
+    obj.get('device_real_time_data', { "devIds" : "4" }, error)
+    assert False
+except ValueError as e:
+    print(e)
+assert obj.get('device_real_time_data', { "devIds" : "4" }, fetch("k")) == "k"
+
+# The cache is bounded, least recently used entries are evicted first
+obj = ResponseCache(max_size=2)
+for i in range(3):
+    obj.get('device_real_time_data', { "devIds" : str(i) }, fetch(i))
+assert obj.get('device_real_time_data', { "devIds" : "0" }, fetch("l")) == "l"
+assert obj.get('device_real_time_data', { "devIds" : "2" }, fetch("m")) == 2
@@ -0,0 +1,66 @@
+import sys
+sys.path.append('../HuaweiFusionSolar')
+
+from PowerNowcaster import PowerNowcaster
+
+# Offline: readings are synthetic and the history request is answered locally
+# (no SmartPVMS access needed)
+START = 1700000000
+INTERVAL = 300
+
+class Inverter(object):
+    device_type = 38
+    device_id = "1"
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = []
+
+    def device_history_data(self, devTypeId, startTime, endTime, devIds=None):
+        self.requests.append((devTypeId, startTime, endTime, devIds))
+        return [row for row in self.rows if startTime <= row['collectTime'] <= endTime]
+
+def row(i, power):
+    return { "devId" : 1, "collectTime" : (START + i * INTERVAL) * 1000,
+            "dataItemMap" : { "active_power" : power } }
+
+# No estimate before the first reading
+obj = PowerNowcaster()
+assert obj.nowcast(START) == (None, None, None)
+
+# Ramp of 0.1 kW per refresh: the trend converges and is extrapolated
+for i in range(30):
+    obj.update(1.0 + 0.1 * i, START + i * INTERVAL)
+last = START + 29 * INTERVAL
+expected, low, high = obj.nowcast(last + INTERVAL / 2)
+print("trend: %.3f kW/refresh, nowcast: %.3f [%.3f, %.3f]" % (obj.trend, expected, low, high))
+assert abs(obj.trend - 0.1) < 1e-3
+assert abs(expected - 3.95) < 1e-2 and low < expected < high
+
+# The band widens with the time since the last reading
+expected_later, low_later, high_later = obj.nowcast(last + 10 * INTERVAL)
+assert abs(expected_later - 4.9) < 1e-2
+assert high_later - low_later > high - low
+
+# Older readings and missing values are ignored
+obj.update(100.0, START)
+obj.update(None, last + INTERVAL)
+assert obj.last_time == last and obj.nowcast(last)[0] < 4
+
+# A step change widens the band (error variance)
+obj.update(0.0, last + INTERVAL)
+assert obj.nowcast(last + INTERVAL)[2] - obj.nowcast(last + INTERVAL)[1] > high - low
+
+# Seeding sorts the history samples and skips null values
+obj = PowerNowcaster()
+obj.seed([row(i, 2.0 if i % 2 else None) for i in range(10)][::-1])
+assert obj.last_time == START + 9 * INTERVAL
+assert obj.nowcast(START + 10 * INTERVAL) == (2.0, 2.0, 2.0)
+
+# Seeding from an inverter requests the history of the day once
+inverter = Inverter([row(i, 1.0 + 0.1 * i) for i in range(30)])
+obj = PowerNowcaster()
+obj.seed_from_inverter(inverter, last)
+print("history requests: %s" % inverter.requests)
+assert len(inverter.requests) == 1 and inverter.requests[0][2] == last * 1000
+assert obj.last_time <= last and obj.nowcast(last)[0] > 1.0
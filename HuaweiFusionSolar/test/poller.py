@@ -0,0 +1,54 @@
+import sys
+import math
+from datetime import datetime, timezone
+sys.path.append('../HuaweiFusionSolar')
+
+from AdaptivePoller import AdaptivePoller, sun_times
+
+# Offline: poll times are computed for given dates (no SmartPVMS access needed)
+ATHENS = (37.98, 23.73)
+TROMSO = (69.65, 18.96)
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+# Sunrise 06:02 and sunset 20:51 (UTC+3) in Athens on the summer solstice
+sunrise, sunset = sun_times(*ATHENS, utc(2024, 6, 21, 12))
+print("sunrise: %s, sunset: %s" % (datetime.fromtimestamp(sunrise, timezone.utc),
+                                    datetime.fromtimestamp(sunset, timezone.utc)))
+assert abs(sunrise - utc(2024, 6, 21, 3, 2)) < 120
+assert abs(sunset - utc(2024, 6, 21, 17, 51)) < 120
+
+# Polar night and midnight sun
+assert sun_times(*TROMSO, utc(2024, 12, 21, 12)) == (None, None)
+assert sun_times(*TROMSO, utc(2024, 6, 21, 12)) == (-math.inf, math.inf)
+
+obj = AdaptivePoller(*ATHENS)
+assert obj.is_daylight(utc(2024, 6, 21, 12))
+assert obj.is_daylight(sunset + 60) and not obj.is_daylight(sunset + obj.margin + 60)
+assert not obj.is_daylight(utc(2024, 6, 21, 22))
+
+# Day polls just after the next refresh (offset after a multiple of the
+# interval) near the trigger power, less often far from it
+now = utc(2024, 6, 21, 9, 0, 30)
+assert obj.next_poll(None, None, now) == utc(2024, 6, 21, 9, 1)
+assert obj.next_poll(1.9, 2.0, now) == utc(2024, 6, 21, 9, 1)
+assert obj.next_poll(1.0, 2.0, now) == utc(2024, 6, 21, 9, 11)
+assert obj.next_poll(10.0, 2.0, now) == utc(2024, 6, 21, 9, 11)
+assert obj.delay(1.9, 2.0, now) == 30
+print("delay near trigger: %d s, far from trigger: %d s" % (obj.delay(1.9, 2.0, now),
+                                                            obj.delay(10.0, 2.0, now)))
+
+# No polls at night: first poll after the next sunrise (minus the margin)
+now = utc(2024, 6, 21, 22)
+next_poll = obj.next_poll(1.0, 2.0, now)
+print("next poll: %s" % datetime.fromtimestamp(next_poll, timezone.utc))
+sunrise = sun_times(*ATHENS, utc(2024, 6, 22, 12))[0]
+assert sunrise - obj.margin <= next_poll < sunrise - obj.margin + obj.interval
+assert (next_poll - obj.offset) % obj.interval == 0
+
+# Polar night: next poll when the sun rises again
+obj = AdaptivePoller(*TROMSO)
+next_poll = obj.next_poll(None, None, utc(2024, 12, 21, 12))
+print("next poll: %s" % datetime.fromtimestamp(next_poll, timezone.utc))
+assert utc(2025, 1, 1) < next_poll < utc(2025, 2, 1)
@@ -0,0 +1,131 @@
+import sys
+import json
+import threading
+sys.path.append('../HuaweiFusionSolar')
+
+import QuotaScheduler as quota_module
+from QuotaScheduler import QuotaScheduler, QuotaExceededError, QUOTA_WAIT, QUOTA_REJECT, WINDOW_5_MIN
+from ResponseCache import ResponseCache
+from HuaweiFusionSolar import HuaweiFusionSolar
+
+# Offline: quota windows run on a simulated clock and requests are answered
+# locally (no SmartPVMS access needed)
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+clock = Clock(1700000000.0)
+quota_module.time = clock
+
+
+class Response(object):
+    def __init__(self, body, headers=None):
+        self.content = json.dumps(body).encode()
+        self.headers = headers or {}
+
+
+class Session(object):
+    def __init__(self, expired=0):
+        self.requests = []
+        self.expired = expired
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, data=None):
+        with self.lock:
+            self.requests.append((url, json.loads(data)))
+            if self.expired > 0:
+                self.expired -= 1
+                return Response({ "success" : False, "failCode" : 305, "data" : None })
+
+        if url.endswith('/login'):
+            return Response({ "success" : True, "failCode" : 0 }, { "xsrf-token" : "TOKEN" })
+
+        ids = json.loads(data).get('devIds', '').split(',')
+        return Response({ "success" : True, "failCode" : 0, "data" : [{ "devId" : i } for i in ids] })
+
+    def close(self):
+        pass
+
+
+class OfflineClient(HuaweiFusionSolar):
+    def login(self):
+        if self.xsrf_token is None:
+            self.xsrf_token = "TOKEN"
+        else:
+            self.session.post(f'{self.endpoint}/thirdData/login', data="{}")
+
+
+# Limits scale with the plants and devices (per type) of the account
+obj = QuotaScheduler(nr_plants=150)
+assert obj.limit('plant_list') == 2 * 10 + 25
+assert obj.limit('device_real_time_data') == 1
+obj.observe('device_real_time_data', 250, 1)
+obj.observe('device_real_time_data', 150, 38)
+print("device_real_time_data limit:", obj.limit('device_real_time_data'))
+assert obj.limit('device_real_time_data') == 3 + 2
+assert obj.limit('unknown') is None and obj.try_acquire('unknown') is None
+
+# Sliding window: a call frees up one window after it was made
+obj = QuotaScheduler(policy=QUOTA_WAIT)
+assert obj.try_acquire('device_real_time_data') is None
+clock.sleep(100)
+delay = obj.try_acquire('device_real_time_data')
+print("delay:", delay)
+assert delay == WINDOW_5_MIN - 100
+clock.sleep(delay - 1)
+assert obj.try_acquire('device_real_time_data') == 1
+clock.sleep(1)
+assert obj.try_acquire('device_real_time_data') is None
+assert obj.remaining('device_real_time_data') == 0
+assert obj.remaining()['device_real_time_data'] == 0
+
+# Waiting acquire sleeps until the slot frees up
+start = clock.now
+obj.acquire('device_real_time_data')
+assert clock.now - start == WINDOW_5_MIN
+
+# Calls exceeding the budget (or the maximum wait) are rejected
+obj = QuotaScheduler(policy=QUOTA_REJECT)
+obj.try_acquire('device_real_time_data')
+try:
+    obj.try_acquire('device_real_time_data')
+    assert False
+except QuotaExceededError as e:
+    print(e)
+obj = QuotaScheduler(policy=QUOTA_WAIT, max_wait=10)
+obj.acquire('device_real_time_data')
+try:
+    obj.acquire('device_real_time_data')
+    assert False
+except QuotaExceededError as e:
+    print(e)
+
+# Client: one call per chunk of 100 ids, retries after a re-login are not
+# charged again
+quota = QuotaScheduler(policy=QUOTA_REJECT)
+client = OfflineClient('user', 'pass', 'domain', quota=quota,
+                        cache=ResponseCache(ttl={ "device_real_time_data" : 0 }))
+client.session = Session()
+data = client.device_real_time_data(1, devIds=[str(i) for i in range(250)])
+print("rows: %d, requests: %d, remaining: %d" % (len(data), len(client.session.requests),
+                                                client.quota_remaining('device_real_time_data')))
+assert len(data) == 250 and len(client.session.requests) == 3
+assert client.quota_remaining('device_real_time_data') == 0
+
+try:
+    client.device_real_time_data(1, devIds='1')
+    assert False
+except QuotaExceededError as e:
+    print(e)
+
+client.session = Session(expired=1)
+data = client.device_history_data(1, 0, 1, devIds='1')
+assert data == [{ "devId" : "1" }] and client.relogin_count == 1
+assert client.quota_remaining('device_history_data') == quota.limit('device_history_data') - 1
+client.close()
@@ -0,0 +1,48 @@
+import sys
+import json
+import random
+import tracemalloc
+sys.path.append('../HuaweiFusionSolar')
+
+from KpiRecord import DeviceKpiRecord, KpiSchema
+
+# Synthetic device_history_data rows of a residential inverter (no SmartPVMS
+# access needed)
+NR_ROWS = 10000
+KPIS = ["inverter_state", "ab_u", "bc_u", "ca_u", "a_u", "b_u", "c_u", "a_i",
+        "b_i", "c_i", "efficiency", "temperature", "power_factor", "elec_freq",
+        "active_power", "reactive_power", "day_cap", "mppt_power", "pv1_u",
+        "pv2_u", "pv1_i", "pv2_i", "total_cap", "open_time", "close_time",
+        "mppt_total_cap", "mppt_1_cap", "mppt_2_cap"]
+SUBSET = ["active_power", "day_cap", "total_cap"]
+
+payload = json.dumps([{
+    "devId" : 1000000000000000 + i % 100,
+    "sn" : "SN%08d" % (i % 100),
+    "collectTime" : 1700000000000 + i * 300000,
+    "dataItemMap" : { kpi : round(random.uniform(0, 1000), 3) for kpi in KPIS }
+} for i in range(NR_ROWS)])
+
+
+def bytes_per_row(build):
+    tracemalloc.start()
+    rows = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+
+    return size / NR_ROWS
+
+
+print("Rows: %d, KPIs per row: %d" % (NR_ROWS, len(KPIS)))
+
+print("dict rows:")
+print("%.0f bytes/row" % bytes_per_row(lambda: json.loads(payload)))
+
+print("DeviceKpiRecord (all KPIs parsed):")
+print("%.0f bytes/row" % bytes_per_row(
+    lambda: DeviceKpiRecord.from_payload(json.loads(payload))))
+
+print("DeviceKpiRecord (%s parsed, rest lazy):" % ", ".join(SUBSET))
+print("%.0f bytes/row" % bytes_per_row(
+    lambda: DeviceKpiRecord.from_payload(json.loads(payload), KpiSchema(SUBSET))))
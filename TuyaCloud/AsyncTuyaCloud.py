@@ -0,0 +1,489 @@
+import time
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from TuyaCloud import TUYA_ENDPOINTS, RESPONSE_KEYS, TOKEN_RETRIES, TOKEN_REFRESH_MARGIN, \
+                    SHADOW_MAX_AGE, DEVICES_URL, TuyaSigner, get_shadow, refresh_delay, \
+                    token_url, command_url, status_url, batch_status_urls, log_request, \
+                    token_expired, check_response, parse_commands, command_result, \
+                    device_status, status_result, shadow_statuses, batch_status_result, \
+                    print_device_list
+from JsonCodec import default_codec
+from QueueLogger import get_logger
+"""
+AsyncTuyaCloud is the asyncio counterpart of TuyaCloud (see AsyncTuyaSwitch and
+AsyncTuyaThermostat), to control many devices from one event loop without a
+thread per device.
+
+Requests are built, signed (TuyaSigner) and parsed by the TuyaCloud helpers,
+AsyncTuyaCloud only sends them through an aiohttp session shared by all clients
+of a region (closed when the last client using it is closed), with:
+    - bounded concurrency   at most max_concurrency requests in flight per
+                            region (others wait for a slot)
+    - timeouts              each request is cancelled after timeout seconds
+                            (asyncio.TimeoutError)
+    - cancellation          cancelling a task cancels its request and releases
+                            its slot
+
+The access token is shared by all clients of a (region, client id) pair and
+renewed once (single-flight) when it expires or is reported invalid. The
+device status shadow is shared with TuyaCloud clients of the same client id.
+
+Clients can be used from successive event loops (ex: one asyncio.run per poll):
+the session and the token lock are recreated in the running loop, the session
+of the previous loop being closed.
+
+Ex:
+    async with AsyncTuyaSwitch('eu', client_id, client_secret, device_id) as obj:
+        await obj.turn_on(['switch_1'])
+
+Requires aiohttp.
+"""
+
+################################################################################
+# Async transport config.
+################################################################################
+ASYNC_MAX_CONCURRENCY = 20          # Maximum requests in flight per region
+ASYNC_TIMEOUT = 10                  # Request timeout (seconds)
+
+
+class AsyncTuyaTransport(object):
+    def __init__(self, endpoint, max_concurrency=ASYNC_MAX_CONCURRENCY, timeout=ASYNC_TIMEOUT):
+        """
+        aiohttp session shared by all async clients of a region.
+
+        Parameters:
+            endpoint        : Region endpoint (TUYA_ENDPOINTS)
+            max_concurrency : Maximum requests in flight
+            timeout         : Request timeout (seconds)
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncTuyaCloud requires aiohttp!")
+
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.session = None
+        self.semaphore = None
+        self.loop = None
+        self.clients = 0
+
+
+    def attach(self):
+        """
+        Register a client using the transport.
+        """
+        self.clients += 1
+
+
+    async def release(self):
+        """
+        Unregister a client, closing the session when no client is left.
+        """
+        self.clients = max(self.clients - 1, 0)
+        if self.clients == 0:
+            await self.close()
+
+
+    async def __ensure(self):
+        """
+        Create the session and semaphore in the running event loop. A session
+        created in another event loop (ex: a previous asyncio.run) is closed.
+        """
+        loop = asyncio.get_running_loop()
+        if self.session is not None and not self.session.closed and self.loop is loop:
+            return
+
+        stale, stale_loop = self.session, self.loop
+        self.loop = loop
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+                            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                            timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        await self.__close_session(stale, stale_loop)
+
+
+    async def __close_session(self, session, loop):
+        """
+        Close a session created in the given event loop.
+        """
+        if session is None or session.closed:
+            return
+
+        if loop is not None and loop is not asyncio.get_running_loop() and loop.is_running():
+            # Still running in another thread, close the session there
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+        else:
+            await session.close()
+
+
+    async def request(self, method, url, headers, data=None):
+        """
+        Send a request, returning the response body.
+        """
+        await self.__ensure()
+
+        async with self.semaphore:
+            async with self.session.request(method, url, headers=headers, data=data) as response:
+                return await response.read()
+
+
+    async def close(self):
+        """
+        Close the session (in-flight requests of every client are aborted).
+        """
+        session, self.session = self.session, None
+        await self.__close_session(session, self.loop)
+
+
+################################################################################
+# Process wide async transports (one per region)
+################################################################################
+_transports = {}
+
+
+def get_async_transport(client_region, max_concurrency=ASYNC_MAX_CONCURRENCY, timeout=ASYNC_TIMEOUT):
+    """
+    Return the async transport shared by all async clients of the given region.
+    Concurrency and timeout are only used when the transport is created.
+    """
+    transport = _transports.get(client_region)
+    if transport is None:
+        transport = AsyncTuyaTransport(TUYA_ENDPOINTS[client_region], max_concurrency, timeout)
+        _transports[client_region] = transport
+
+    return transport
+
+
+class AsyncTuyaTokenManager(object):
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN):
+        """
+        Access token shared by all async clients of a (region, client id) pair.
+
+        Parameters:
+            refresh_margin  : Seconds before expiry to renew the token on next
+                              use (None to renew only when reported invalid)
+        """
+        self.refresh_margin = refresh_margin
+        self.access_token = None
+        self.refresh_token = None
+        self.expire_at = None
+        self.refresh_at = None
+        self.refresh_count = 0
+        self.lock = None
+        self.loop = None
+
+
+    def __lock(self):
+        """
+        Return the refresh lock of the running event loop (an asyncio.Lock can
+        only be used in one event loop).
+        """
+        loop = asyncio.get_running_loop()
+        if self.lock is None or self.loop is not loop:
+            self.lock = asyncio.Lock()
+            self.loop = loop
+
+        return self.lock
+
+
+    async def refresh(self, fetch, stale_token=None):
+        """
+        Replace stale_token with the token result returned by
+        await fetch(refresh_token). Concurrent callers wait for the refresh in
+        progress and reuse its token.
+        """
+        async with self.__lock():
+            if self.access_token is not None and self.access_token != stale_token:
+                return self.access_token
+
+            result = await fetch(self.refresh_token)
+            self.access_token = result['access_token']
+            self.refresh_token = result.get('refresh_token')
+            self.refresh_count += 1
+
+            expire_time = result.get('expire_time')
+            self.expire_at = self.refresh_at = None
+            if expire_time is not None:
+                now = time.time()
+                self.expire_at = now + int(expire_time)
+                if self.refresh_margin is not None:
+                    self.refresh_at = now + refresh_delay(int(expire_time), self.refresh_margin)
+
+            return self.access_token
+
+
+    async def get(self, fetch):
+        """
+        Return the access token, renewing it first if it is missing or about
+        to expire.
+        """
+        if self.access_token is None or (self.refresh_at is not None
+                                        and time.time() >= self.refresh_at):
+            return await self.refresh(fetch, self.access_token)
+
+        return self.access_token
+
+
+################################################################################
+# Process wide async token managers (one per region and client id)
+################################################################################
+_token_managers = {}
+
+
+def get_async_token_manager(client_region, client_id, refresh_margin=TOKEN_REFRESH_MARGIN):
+    """
+    Return the async token manager shared by all async clients of the given
+    region and client id.
+    """
+    key = (client_region, client_id)
+    manager = _token_managers.get(key)
+    if manager is None:
+        manager = AsyncTuyaTokenManager(refresh_margin)
+        _token_managers[key] = manager
+
+    return manager
+
+
+class AsyncTuyaCloud(object):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None,
+                max_concurrency=ASYNC_MAX_CONCURRENCY, timeout=ASYNC_TIMEOUT,
+                token_refresh_margin=TOKEN_REFRESH_MARGIN, json_codec=None,
+                shadow_max_age=SHADOW_MAX_AGE):
+        """
+        Create an async Tuya Iot Cloud client (the access token is requested on
+        first use or by connect).
+
+        Parameters:
+            client_region   : Region (cn|w-us|e-us|eu|w-eu|in)
+            client_id       : Client id (Cloud > "Project" > Authorization Ket > Access ID/Client ID)
+            client_secret   : Client id (Cloud > "Project" > Authorization Ket > Access Secret/Client Secret)
+            device_id       : Tuya device id (set by particular classes that inherit this class)
+            log_file        : Filename to be used for logging
+            max_concurrency : Maximum requests in flight of the shared region
+                              transport (only used by the first client of a
+                              region)
+            timeout         : Request timeout in seconds (only used by the
+                              first client of a region)
+            token_refresh_margin
+                            : Seconds before expiry to renew the shared token
+                              (None to renew only when reported invalid)
+            json_codec      : JsonCodec used for responses and command bodies
+                              (default_codec() if None).
+            shadow_max_age  : Seconds a known device status is served locally
+                              (None to disable, only used by the first client
+                              of a region and client id)
+        """
+        self.logger = None
+        self.log_counters = {}
+        self.device_id = device_id
+        self.client_id = client_id
+        self.client_region = client_region
+        self.codec = json_codec if json_codec is not None else default_codec()
+
+        # Region validation
+        if self.client_region not in TUYA_ENDPOINTS:
+            raise ValueError("Invalid value for client region")
+
+        self.endpoint = TUYA_ENDPOINTS[self.client_region]
+        self.transport = get_async_transport(self.client_region, max_concurrency, timeout)
+        self.attached = False
+
+        # Configure logger (if given)
+        if log_file is not None:
+            self.logger = get_logger(log_file, __name__)
+
+        # Request signature
+        self.signer = TuyaSigner(client_id, client_secret)
+
+        self.token = get_async_token_manager(self.client_region, self.client_id,
+                                            token_refresh_margin)
+        self.shadow = get_shadow(self.client_region, self.client_id, shadow_max_age)
+
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+    async def connect(self):
+        """
+        Get the access token (shared with other clients of the same client id).
+        """
+        self.__attach()
+        await self.token.get(self.__request_access_token)
+
+
+    def __attach(self):
+        """
+        Keep the shared region transport open until this client is closed.
+        """
+        if not self.attached:
+            self.attached = True
+            self.transport.attach()
+
+
+    async def close(self):
+        """
+        Release the shared region transport (its session is closed when the
+        last async client of the region using it is closed).
+        """
+        if self.attached:
+            self.attached = False
+            await self.transport.release()
+
+
+    async def __send(self, name, method, url, content=None, token_request=False):
+        """
+        Sign and send a request to Tuya IoT Cloud, returning the json response
+        (see TuyaCloud.__send).
+        """
+        REQUEST_URL = f'{self.endpoint}{url}'
+
+        self.__attach()
+
+        for attempt in range(TOKEN_RETRIES + 1):
+            access_token = None
+            if not token_request:
+                access_token = await self.token.get(self.__request_access_token)
+            headers = self.signer.sign(method, url, content, access_token, token_request)
+
+            # Log
+            log_request(self.logger, self.log_counters, name, REQUEST_URL, headers, content)
+
+            # Send request
+            body = await self.transport.request(method, REQUEST_URL, headers, content)
+
+            json_response = self.codec.loads(body, RESPONSE_KEYS)
+            if json_response['success'] == True:
+                break
+
+            # Log
+            if self.logger:
+                self.logger.error("[%s] response=[%s]", name, json_response)
+
+            # If token has expired, refresh it
+            if not token_expired(json_response, token_request):
+                break
+
+            await self.token.refresh(self.__request_access_token, access_token)
+
+        return json_response
+
+
+    async def __request_access_token(self, refresh_token=None):
+        """
+        Request a new access token (called by the token manager).
+        """
+        _NAME = self.refresh_access_token.__name__
+
+        if refresh_token is not None:
+            json_response = await self.__send(_NAME, "GET", token_url(refresh_token),
+                                            token_request=True)
+            if json_response['success'] == True:
+                return json_response['result']
+
+        json_response = await self.__send(_NAME, "GET", token_url(), token_request=True)
+
+        return check_response(json_response, "Access token refresh error")
+
+
+    @property
+    def access_token(self):
+        return self.token.access_token
+
+
+    async def command(self, content=None):
+        """
+        Send a command to a Tuya device (see TuyaCloud.command, without command
+        window).
+        """
+        _NAME = self.command.__name__
+
+        commands = parse_commands(self.codec, content)
+        if commands and self.shadow.is_noop(self.device_id, commands):
+            return False
+
+        json_response = await self.__send(_NAME, "POST", command_url(self.device_id), content)
+
+        return command_result(self.shadow, self.device_id, commands, json_response)
+
+
+    async def refresh_access_token(self):
+        """
+        Renew the shared access token (concurrent renewals result in a single
+        token request).
+        """
+        await self.token.refresh(self.__request_access_token, self.token.access_token)
+
+
+    async def get_devices(self):
+        """
+        Get Tuya devices for current user.
+        """
+        _NAME = self.get_devices.__name__
+
+        json_response = await self.__send(_NAME, "GET", DEVICES_URL)
+
+        return check_response(json_response, "Unable to get devices list")['devices']
+
+
+    async def get_device_status(self, status=None):
+        """
+        Get single device status (see TuyaCloud.get_device_status).
+        """
+        _NAME = self.get_device_status.__name__
+
+        if status is not None:
+            return device_status(self.device_id, status)
+
+        shadow_status = self.shadow.status(self.device_id)
+        if shadow_status is not None:
+            return shadow_status
+
+        json_response = await self.__send(_NAME, "GET", status_url(self.device_id))
+
+        return status_result(self.shadow, self.device_id, json_response)
+
+
+    async def get_devices_status(self, device_ids=None, refresh=False):
+        """
+        Get the status of multiple devices (see TuyaCloud.get_devices_status).
+        The batched requests are sent concurrently.
+        """
+        _NAME = self.get_devices_status.__name__
+
+        if device_ids is None:
+            device_ids = [self.device_id]
+
+        result, device_ids = shadow_statuses(self.shadow, device_ids, refresh)
+        responses = await asyncio.gather(*[self.__send(_NAME, "GET", url)
+                                            for url in batch_status_urls(device_ids)])
+        for json_response in responses:
+            batch_status_result(self.shadow, json_response, result)
+
+        return result
+
+
+    async def print_devices(self):
+        """
+        Print all devices for current user (get_devices)
+        """
+        print_device_list(await self.get_devices())
+
+
+    def transport_stats(self):
+        """
+        Return the concurrency settings of the shared region transport.
+        """
+        return { "max_concurrency" : self.transport.max_concurrency,
+                "timeout" : self.transport.timeout }
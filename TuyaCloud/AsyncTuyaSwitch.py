@@ -0,0 +1,104 @@
+from AsyncTuyaCloud import AsyncTuyaCloud
+from TuyaSwitch import switch_body, switch_status
+
+"""
+AsyncTuyaSwitch is the asyncio counterpart of TuyaSwitch (see AsyncTuyaCloud):
+same methods, as coroutines.
+
+Class has the following methods:
+
+    1) turn_on
+        Allow turning on multiple switches specified by name in the switch_list
+        input parameter.
+
+    2) turn_off
+        Allow turning off multiple switches specified by name in the switch_list
+        input parameter.
+
+    3) turn_cusom
+        Allow custom actions at once for multiple switches specified by name and
+        vale (action) in the switch_dict input parameter.
+
+    4) get_status
+        Get switch device status (optionally from a shared get_devices_status
+        result).
+
+Commands return the result of AsyncTuyaCloud.command.
+"""
+
+class AsyncTuyaSwitch(AsyncTuyaCloud):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None, **kwargs):
+        # Call constructor for AsyncTuyaCloud (token requested on first use)
+        super().__init__(client_region, client_id, client_secret, device_id, log_file, **kwargs)
+
+    async def turn_on(self, switch_list=None):
+        """
+        Turn on switch(es).
+
+        Parameters:
+            switch_list  : List with switches names to be turned on.
+
+        Ex:
+            await obj.turn_on(['switch_1','switch_2'])
+        """
+
+        if switch_list is None:
+            return
+
+        # Create request body
+        body = switch_body(dict.fromkeys(switch_list, True))
+        return await super().command(content=self.codec.dumps(body))
+
+    async def turn_off(self, switch_list=None):
+        """
+        Turn on switch(es).
+
+        Parameters:
+            switch_list  : List with switches names to be turned off.
+
+        Ex:
+            await obj.turn_off(['switch_1','switch_2'])
+        """
+
+        if switch_list is None:
+            return
+
+        # Create request body
+        body = switch_body(dict.fromkeys(switch_list, False))
+        return await super().command(content=self.codec.dumps(body))
+
+    async def turn_custom(self, switch_dict=None):
+        """
+        Turn custom switch.
+
+        Parameters:
+            switch_dict : Dictionary with switch name as key and the action
+                          (True/False) as value.
+        """
+
+        if switch_dict is None:
+            return
+
+        # Create request body
+        body = switch_body(switch_dict)
+        return await super().command(content=self.codec.dumps(body))
+
+    async def get_status(self, switch_list=None, status=None):
+        """
+        Get status of switch(es).
+
+        Parameters:
+            switch_list  : List with switches names to get status.
+            status       : Result of get_devices_status to read from (no
+                           request is sent).
+
+        Ex:
+            await obj.get_status(['switch_1','switch_2'])
+        """
+        if switch_list is None:
+            return
+
+        # Get status
+        device_status_dict = await super().get_device_status(status)
+
+        return switch_status(device_status_dict, switch_list)
@@ -0,0 +1,182 @@
+from AsyncTuyaCloud import AsyncTuyaCloud
+from TuyaThermostat import thermostat_body, thermostat_status
+
+"""
+AsyncTuyaThermostat is the asyncio counterpart of TuyaThermostat (see
+AsyncTuyaCloud): same methods, as coroutines.
+
+Class has the following methods:
+
+    1) turn_on
+        Turn the thermostat on.
+
+    2) turn_off
+        Turn the thermostat off.
+
+    3) window_check_on
+        Turn on open window detection.
+
+    4) window_check_off
+        Turn off open window detection.
+
+    5) frost_on
+        Turn on frost protection.
+
+    6) frost_off
+        Turn off frost protection.
+
+    7) get_room_temperature
+        Get room temperature.
+
+    8) get_trigger_temperature
+        Get trigger temperature.
+
+    9) set_trigger_temperature
+        Set trigger temperature.
+
+Status getters optionally read from a shared get_devices_status result.
+"""
+
+class AsyncTuyaThermostat(AsyncTuyaCloud):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None, **kwargs):
+        # Call constructor for AsyncTuyaCloud (token requested on first use)
+        super().__init__(client_region, client_id, client_secret, device_id, log_file, **kwargs)
+
+    async def __command(self, body):
+        """
+        Send a command body, printing request errors.
+        """
+        try:
+            return await super().command(content=self.codec.dumps(body))
+        except ValueError as e:
+            print(f'Error: {e}')
+            return
+
+    async def turn_on(self):
+        """
+        Turn on thermostat.
+
+        Ex:
+            await obj.turn_on()
+        """
+
+        # Create request body
+        body = thermostat_body('switch', True)
+        return await self.__command(body)
+
+    async def turn_off(self):
+        """
+        Turn on thermostat.
+
+        Ex:
+            await obj.turn_off()
+        """
+
+        # Create request body
+        body = thermostat_body('switch', False)
+        return await self.__command(body)
+
+    async def window_check_on(self):
+        """
+        Turn on open window detection.
+
+        Ex:
+            await obj.window_check()
+        """
+
+        # Create request body
+        body = thermostat_body('window_check', True)
+        return await self.__command(body)
+
+    async def window_check_off(self):
+        """
+        Turn off open window detection.
+
+        Ex:
+            await obj.window_check_off()
+        """
+
+        # Create request body
+        body = thermostat_body('window_check', False)
+        return await self.__command(body)
+
+    async def frost_on(self):
+        """
+        Turn on frost protection.
+
+        Ex:
+            await obj.frost()
+        """
+
+        # Create request body
+        body = thermostat_body('frost', True)
+        return await self.__command(body)
+
+    async def frost_off(self):
+        """
+        Turn off frost protection.
+
+        Ex:
+            await obj.frost_off()
+        """
+
+        # Create request body
+        body = thermostat_body('frost', False)
+        return await self.__command(body)
+
+    async def get_room_temperature(self, status=None):
+        """
+        Get room temperature.
+
+        Ex:
+            await obj.get_room_temperature()
+        """
+
+        # Get status
+        status = await self.get_status(status)
+
+        # Parse 'temp_current'
+        return status.get('temp_current', -1)
+
+    async def get_trigger_temperature(self, status=None):
+        """
+        Get trigger temperature.
+
+        Ex:
+            await obj.get_trigger_temperature()
+        """
+
+        # Get status
+        status = await self.get_status(status)
+
+        # Parse 'temp_set'
+        return status.get('temp_set', -1)
+
+    async def set_trigger_temperature(self, temp):
+        """
+        Set trigger temperature.
+
+        Ex:
+            await obj.set_trigger_temperature(240)
+        """
+
+        # Create request body
+        body = thermostat_body('temp_set', temp)
+        return await self.__command(body)
+
+    async def get_status(self, status=None):
+        """
+        Get status of switch(es).
+
+        Parameters:
+            status      : Result of get_devices_status to read from (no request
+                          is sent).
+
+        Ex:
+            await obj.get_status()
+        """
+
+        # Get status
+        device_status_dict = await super().get_device_status(status)
+
+        return thermostat_status(device_status_dict)
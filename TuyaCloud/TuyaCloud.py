@@ -1,12 +1,20 @@
-import json
+import os
+import sys
 import uuid
 import hmac
 import time
 import hashlib
 import logging
 import requests
+import threading
 
-from logging.handlers import RotatingFileHandler
+# Modules shared by the HuaweiFusionSolar and TuyaCloud clients
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Common'))
+
+from concurrent.futures import Future
+from JsonCodec import default_codec
+from QueueLogger import LogBody, get_logger, sampled
+from requests.adapters import HTTPAdapter
 """
 TuyaCloud is designed as a main class for specific Tuya compatible devices
 (ex: TuyaSwitch) implementing the main methods for each device.
@@ -19,17 +27,19 @@ https://iot.tuya.com/
     the access token to be used for communication (note that this expires and
     has to be refreshed)
 
-2) __create_signature (dunder method)
+2) __create_signature (TuyaSigner dunder method)
     Create the signature for each request perform by a Tuya Device.
 
-3) __create_string_to_sign (dunder method)
+3) __create_string_to_sign (TuyaSigner dunder method)
     Create the stringToSign required in signature computation
 
-4) __create_request_headers (dunder method)
+4) __create_request_headers (TuyaSigner dunder method)
     Create the headers for a given request.
 
 5) command
-    Send a custom command to a Tuya device using POST request
+    Send a custom command to a Tuya device using POST request (skipped if the
+    device shadow already has the commanded values). With a command window,
+    commands are merged per device and a Future is returned.
 
 6) get_devices
     Return a list with all devices associated with current user.
@@ -37,8 +47,17 @@ https://iot.tuya.com/
 7) get_device_status
     Return device status as json.
 
-7) print_devices
+8) get_devices_status
+    Return the status of multiple devices (batched requests) by device id.
+
+9) print_devices
     Print the list returned by get_devices method
+
+10) transport_stats
+    Return connection reuse statistics of the shared region transport.
+
+Signatures (TuyaSigner), request paths and response parsing do not perform any
+I/O and are shared with AsyncTuyaCloud.
 """
 
 ################################################################################
@@ -68,65 +87,469 @@ EMPTY_BODY_ENCRYPTION = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991
 # refreshed.
 ################################################################################
 INVALID_TOKEN = 1010
+RESPONSE_KEYS = ("success", "code", "msg", "result")
+TOKEN_RETRIES = 2                   # Retries after refreshing the token
 
 ################################################################################
-# Logger config.
+# Batch device status
+#
+# The multi-device status request (GET /v1.0/iot-03/devices/status) accepts a
+# comma separated list of device ids.
 ################################################################################
-LOGGER_LOG_LEVEL = logging.DEBUG    # Default logging level
-LOGGER_FILE_SIZE = 10000000         # 10 MB
-LOGGER_FILE_BACKUP = 5              # Number of backup files
+BATCH_STATUS_SIZE = 20              # Maximum device ids per status request
 
-class TuyaCloud(object):
-    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None):
+################################################################################
+# Proactive token refresh config.
+#
+# The token is refreshed in background (refresh token grant) a margin before
+# it expires, so requests never hit INVALID_TOKEN on expiry.
+################################################################################
+TOKEN_REFRESH_MARGIN = 300          # Seconds before expiry (None to disable)
+TOKEN_RETRY_DELAY = 30              # Seconds between failed background refreshes
+
+################################################################################
+# Logger config. (log files are written by QueueLogger)
+################################################################################
+LOGGER_SAMPLE_RATE = {              # Log 1 of N requests of high rate methods
+    "get_device_status" : 10,
+    "get_devices_status" : 10,
+}
+
+
+################################################################################
+# HTTP transport config.
+#
+# All TuyaCloud instances of a region share one keep-alive session, so devices
+# controlled from the same process reuse the TLS connections to the endpoint.
+################################################################################
+POOL_MAXSIZE = 10                   # Maximum connections kept per region
+POOL_BLOCK = True                   # Wait for a free connection when full
+
+
+class TuyaTransport(object):
+    def __init__(self, endpoint, pool_maxsize=POOL_MAXSIZE):
         """
-        Connect to Tuya Iot Cloud
+        Pooled keep-alive HTTP transport for a Tuya region endpoint.
 
         Parameters:
-            client_region   : Region (cn|w-us|e-us|eu|w-eu|in)
-            client_id       : Client id (Cloud > "Project" > Authorization Ket > Access ID/Client ID)
-            client_secret   : Client id (Cloud > "Project" > Authorization Ket > Access Secret/Client Secret)
-            device_id       : Tuya device id (set by particular classes that inherit this class)
-            log_file        : Filename to be used for logging
+            endpoint        : Region endpoint (TUYA_ENDPOINTS value)
+            pool_maxsize    : Maximum keep-alive connections to the endpoint
         """
+        self.endpoint = endpoint
+        self.pool_maxsize = pool_maxsize
 
-        self.logger = None
-        self.device_id = device_id
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(
+                                pool_connections=1,
+                                pool_maxsize=pool_maxsize,
+                                pool_block=POOL_BLOCK
+                                )
+        self.session.mount('https://', self.adapter)
+
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+
+    def stats(self):
+        """
+        Return connection reuse statistics for the region endpoint.
+        """
+        pool = self.adapter.poolmanager.connection_from_url(self.endpoint)
+
+        return {
+            "requests" : pool.num_requests,
+            "connections" : pool.num_connections,
+            "reused" : max(pool.num_requests - pool.num_connections, 0),
+            "pool_maxsize" : self.pool_maxsize
+        }
+
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        self.session.close()
+
+
+################################################################################
+# Process wide transports (one per region)
+################################################################################
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(client_region, pool_maxsize=POOL_MAXSIZE):
+    """
+    Return the transport shared by all clients of the given region. The pool
+    size is only used when the transport is created.
+    """
+    with _transports_lock:
+        transport = _transports.get(client_region)
+        if transport is None:
+            transport = TuyaTransport(TUYA_ENDPOINTS[client_region], pool_maxsize)
+            _transports[client_region] = transport
+
+        return transport
+
+
+def refresh_delay(expire_time, refresh_margin):
+    """
+    Return the seconds after which a token valid for expire_time seconds is
+    refreshed. The delay is at least half the token lifetime, so a margin not
+    shorter than the lifetime does not refresh continuously.
+    """
+    delay = expire_time - (refresh_margin or 0)
+    if refresh_margin is not None and delay < expire_time // 2:
+        delay = expire_time // 2
+        logging.getLogger(__name__).warning(
+            "Token lifetime (%d s) too short for refresh margin (%d s), "
+            "refreshing after %d s", expire_time, refresh_margin, max(delay, 1))
+
+    return max(delay, 1)
+
+
+class TuyaTokenManager(object):
+    def __init__(self, client_region, client_id, refresh_margin=TOKEN_REFRESH_MARGIN):
+        """
+        Access token shared by all clients of a (region, client id) pair.
+
+        Parameters:
+            client_region   : Region (cn|w-us|e-us|eu|w-eu|in)
+            client_id       : Client id the token belongs to
+            refresh_margin  : Seconds before expiry to refresh the token in
+                              background (None to disable)
+        """
+        self.client_region = client_region
         self.client_id = client_id
+        self.refresh_margin = refresh_margin
         self.access_token = None
-        self.client_secret = client_secret
-        self.client_region = client_region
+        self.refresh_token = None
+        self.expire_at = None
+        self.refresh_count = 0
+        self.lock = threading.Lock()
+        self.timer = None
 
-        # Region validation
-        if self.client_region not in TUYA_ENDPOINTS:
-            raise ValueError("Invalid value for client region")
 
-        self.endpoint = TUYA_ENDPOINTS[self.client_region]
+    def refresh(self, fetch, stale_token=None):
+        """
+        Replace stale_token with the token result returned by
+        fetch(refresh_token).
+
+        Refreshes are single-flight: concurrent callers wait for the one in
+        progress and, finding the stale token already replaced, reuse the new
+        one instead of requesting another.
+        """
+        with self.lock:
+            if self.access_token is not None and self.access_token != stale_token:
+                return self.access_token
+
+            result = fetch(self.refresh_token)
+            self.access_token = result['access_token']
+            self.refresh_token = result.get('refresh_token')
+            self.refresh_count += 1
+
+            expire_time = result.get('expire_time')
+            if expire_time is not None:
+                expire_time = int(expire_time)
+                self.expire_at = time.time() + expire_time
+                self.__schedule(fetch, refresh_delay(expire_time, self.refresh_margin))
+
+            return self.access_token
+
+
+    def expires_in(self):
+        """
+        Return the number of seconds until the token expires (None if unknown).
+        """
+        if self.expire_at is None:
+            return None
+
+        return self.expire_at - time.time()
+
+
+    def __schedule(self, fetch, delay):
+        """
+        Schedule a background refresh after delay seconds.
+        """
+        if self.refresh_margin is None:
+            return
+
+        if self.timer is not None:
+            self.timer.cancel()
+
+        self.timer = threading.Timer(max(delay, 1), self.__refresh_background, args=(fetch,))
+        self.timer.daemon = True
+        self.timer.start()
+
+
+    def __refresh_background(self, fetch):
+        """
+        Timer callback, refresh the token before it expires. On failure, retry
+        after TOKEN_RETRY_DELAY (requests still refresh on INVALID_TOKEN).
+        """
+        try:
+            self.refresh(fetch, self.access_token)
+        except Exception:
+            with self.lock:
+                self.__schedule(fetch, TOKEN_RETRY_DELAY)
+
+
+################################################################################
+# Process wide token managers (one per region and client id)
+################################################################################
+_token_managers = {}
+_token_managers_lock = threading.Lock()
 
-        # Configure logger (if given)
-        if log_file is not None:
-            self.logger = logging.getLogger(__name__)
-            self.logger.setLevel(LOGGER_LOG_LEVEL)
 
-            # Create a rotating file handler
-            file_handler = RotatingFileHandler(
-                                        log_file,
-                                        maxBytes=LOGGER_FILE_SIZE,
-                                        backupCount=LOGGER_FILE_SIZE
-                                            )
+def get_token_manager(client_region, client_id, refresh_margin=TOKEN_REFRESH_MARGIN):
+    """
+    Return the token manager shared by all clients of the given region and
+    client id. The refresh margin is only used when the manager is created.
+    """
+    with _token_managers_lock:
+        key = (client_region, client_id)
+        manager = _token_managers.get(key)
+        if manager is None:
+            manager = TuyaTokenManager(client_region, client_id, refresh_margin)
+            _token_managers[key] = manager
 
-            # Set the desired log level and format
-            file_handler.setLevel(LOGGER_LOG_LEVEL)
-            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-            file_handler.setFormatter(formatter)
+        return manager
 
-            # Add the file handler to the logger
-            self.logger.addHandler(file_handler)
 
-        # Get access token
-        self.refresh_access_token()
+################################################################################
+# Device shadow config.
+#
+# The last known status of each device is kept locally: updated by status
+# requests and, write-through, by successful commands. Within the staleness
+# bound, status reads are served locally and commands not changing any value
+# are skipped.
+################################################################################
+SHADOW_MAX_AGE = 10                 # Staleness bound in seconds (None to disable)
+
+
+class TuyaShadow(object):
+    def __init__(self, max_age=SHADOW_MAX_AGE):
+        """
+        Status shadow of the devices of a (region, client id) pair.
+
+        Parameters:
+            max_age         : Staleness bound in seconds (None to disable)
+        """
+        self.max_age = max_age
+        self.devices = {}           # device id -> { code : (value, time) }
+        self.polled = {}            # device id -> time of last full status
+        self.lock = threading.Lock()
+
+
+    def __fresh(self, t, now):
+        return self.max_age is not None and t is not None and now - t <= self.max_age
+
+
+    def status(self, device_id):
+        """
+        Return the device status (as returned by get_device_status) if known
+        within the staleness bound, None otherwise.
+        """
+        now = time.time()
+        with self.lock:
+            if not self.__fresh(self.polled.get(device_id), now):
+                return None
+
+            return [{ "code" : code, "value" : value }
+                        for code, (value, t) in self.devices[device_id].items()]
+
+
+    def update(self, device_id, status, polled=False):
+        """
+        Update the device with a list of { code, value } (a full status if
+        polled is set).
+        """
+        now = time.time()
+        with self.lock:
+            codes = self.devices.setdefault(device_id, {})
+            for item in status:
+                codes[item['code']] = (item['value'], now)
+            if polled:
+                self.polled[device_id] = now
+
+
+    def is_noop(self, device_id, commands):
+        """
+        Return True if all commands ({ code, value }) set values the device is
+        known to have within the staleness bound.
+        """
+        now = time.time()
+        with self.lock:
+            codes = self.devices.get(device_id, {})
+            for command in commands:
+                value, t = codes.get(command['code'], (None, None))
+                if not self.__fresh(t, now) or value != command['value']:
+                    return False
+
+        return len(commands) > 0
+
+
+    def invalidate(self, device_id=None):
+        """
+        Forget the status of a device (all devices if None).
+        """
+        with self.lock:
+            if device_id is None:
+                self.devices.clear()
+                self.polled.clear()
+            else:
+                self.devices.pop(device_id, None)
+                self.polled.pop(device_id, None)
+
+
+################################################################################
+# Process wide device shadows (one per region and client id)
+################################################################################
+_shadows = {}
+_shadows_lock = threading.Lock()
+
+
+def get_shadow(client_region, client_id, max_age=SHADOW_MAX_AGE):
+    """
+    Return the device shadow shared by all clients of the given region and
+    client id. The staleness bound is only used when the shadow is created.
+    """
+    with _shadows_lock:
+        key = (client_region, client_id)
+        shadow = _shadows.get(key)
+        if shadow is None:
+            shadow = TuyaShadow(max_age)
+            _shadows[key] = shadow
+
+        return shadow
+
+
+################################################################################
+# Command pipeline config.
+#
+# Commands issued for a device within the window are merged into a single
+# request (last value wins for each code).
+################################################################################
+COMMAND_WINDOW = None               # Merge window in seconds (None to disable)
+
 
+class TuyaCommandPipeline(object):
+    def __init__(self, send, window):
+        """
+        Merge the commands of a device issued within a time window.
+
+        Parameters:
+            send            : Function sending a merged list of commands
+                              ({ code, value }), returning the request result.
+            window          : Merge window in seconds.
+        """
+        self.send = send
+        self.window = window
+        self.pending = {}           # code -> value, in first issue order
+        self.futures = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+
+    def submit(self, commands):
+        """
+        Queue a list of commands ({ code, value }) for the next merged request.
+
+        Return a Future resolved with the result of the merged request.
+        """
+        future = Future()
+
+        with self.lock:
+            for command in commands:
+                self.pending[command['code']] = command['value']
+            self.futures.append(future)
+
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
 
-    def __create_signature(self, t, stringToSign, refresh_token=False):
+        return future
+
+
+    def flush(self):
+        """
+        Send the pending commands now (called when the window ends).
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            pending, futures = self.pending, self.futures
+            self.pending, self.futures = {}, []
+
+        if not futures:
+            return
+
+        commands = [{ "code" : code, "value" : value } for code, value in pending.items()]
+        try:
+            result = self.send(commands)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            for future in futures:
+                future.set_result(result)
+
+
+################################################################################
+# Process wide command pipelines (one per region, client id and device)
+################################################################################
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(client_region, client_id, device_id, send, window):
+    """
+    Return the command pipeline shared by all clients of the given region,
+    client id and device, so commands for the switches of a multi-gang device
+    are merged. The send function and window are only used when the pipeline
+    is created.
+    """
+    with _pipelines_lock:
+        key = (client_region, client_id, device_id)
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            pipeline = TuyaCommandPipeline(send, window)
+            _pipelines[key] = pipeline
+
+        return pipeline
+
+
+################################################################################
+# Request signature
+# https://developer.tuya.com/en/docs/iot/new-singnature?id=Kbw0q34cs2e5g
+################################################################################
+class TuyaSigner(object):
+    def __init__(self, client_id, client_secret):
+        """
+        Request signature of a client (no I/O, shared by TuyaCloud and
+        AsyncTuyaCloud).
+
+        Parameters:
+            client_id       : Client id
+            client_secret   : Client secret
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+
+        # Set area id and call id (used for signature calculation)
+        self.area_id = str(int(time.time() * 1000))
+        self.call_id = str(uuid.uuid4())
+
+
+    def __create_signature(self, t, stringToSign, refresh_token=False, access_token=None):
         """
         Build the request signature.
         https://developer.tuya.com/en/docs/iot/new-singnature?id=Kbw0q34cs2e5g
@@ -143,7 +566,7 @@ class TuyaCloud(object):
         if refresh_token:
             data = self.client_id + t + stringToSign
         else:
-            data = self.client_id + self.access_token + t + stringToSign
+            data = self.client_id + access_token + t + stringToSign
 
         return hmac.new(
                         self.client_secret.encode('UTF-8'),
@@ -179,7 +602,7 @@ class TuyaCloud(object):
         return f'{method}\n{content_sha256}\n{headers_sorted}\n{url}'
 
 
-    def __create_request_headers(self, signature, t):
+    def __create_request_headers(self, signature, t, access_token=None):
         """
         Create the headers for a given request.
         https://developer.tuya.com/en/docs/iot/api-request?id=Ka4a8uuo1j4t4
@@ -189,226 +612,452 @@ class TuyaCloud(object):
             "secret" : self.client_secret,
             "sign" : signature,
             "t" : t,
-            "access_token" : self.access_token,
+            "access_token" : access_token,
             "sign_method" : "HMAC-SHA256",
             "Signature-Headers" : "area_id:call_id",
             "area_id" : self.area_id,
             "call_id" : self.call_id
         }
 
-    def command(self, content=None):
+
+    def sign(self, method, url, content=None, access_token=None, token_request=False):
         """
-        Send a command to a Tuya device.
-        https://developer.tuya.com/en/docs/cloud/e2512fb901?id=Kag2yag3tiqn5
+        Sign a request, returning its headers.
+
+        Parameters:
+            method          : HTTP method ("GET" | "POST")
+            url             : Request path with query (without endpoint)
+            content         : Request body (string)
+            access_token    : Access token (business requests)
+            token_request   : Token management request (signed without token)
         """
-        _NAME = self.command.__name__
-        _URL = f'/v1.0/iot-03/devices/{self.device_id}/commands'
         time_now = str(int(time.time() * 1000))
-        COMMAND_URL = f'{self.endpoint}{_URL}'
 
-        # Create signature (use body encryption)
+        # Create signature
         signature_headers = {
             "area_id" : self.area_id,
             "call_id" : self.call_id
         }
         stringToSign = self.__create_string_to_sign(
-                                        method  = "POST",
+                                        method  = method,
                                         content = content,
                                         headers = signature_headers,
-                                        url     = _URL
+                                        url     = url
+                                    )
+        signature = self.__create_signature(
+                                        t               = time_now,
+                                        stringToSign    = stringToSign,
+                                        refresh_token   = token_request,
+                                        access_token    = access_token
                                     )
-
-        signature = self.__create_signature(t=time_now, stringToSign=stringToSign)
 
         # Create request headers
-        headers = self.__create_request_headers(signature, time_now)
+        return self.__create_request_headers(signature, time_now, access_token)
+
+
+################################################################################
+# Request paths and response parsing
+#
+# No I/O, shared by TuyaCloud and AsyncTuyaCloud (which only differ in the way
+# requests are sent).
+################################################################################
+DEVICES_URL = "/v1.0/iot-01/associated-users/devices"
+
+
+def token_url(refresh_token=None):
+    """
+    Return the token request path (refresh token grant if refresh_token is
+    set).
+    """
+    if refresh_token is None:
+        return "/v1.0/token?grant_type=1"
+
+    return f'/v1.0/token/{refresh_token}'
+
+
+def command_url(device_id):
+    return f'/v1.0/iot-03/devices/{device_id}/commands'
+
+
+def status_url(device_id):
+    return f'/v1.0/iot-03/devices/{device_id}/status'
+
+
+def batch_status_urls(device_ids):
+    """
+    Return the multi-device status request paths of a list of device ids
+    (BATCH_STATUS_SIZE devices per request).
+    """
+    return ['/v1.0/iot-03/devices/status?device_ids=' + ','.join(device_ids[i:i + BATCH_STATUS_SIZE])
+                for i in range(0, len(device_ids), BATCH_STATUS_SIZE)]
+
+
+def log_request(logger, counters, name, url, headers, content):
+    """
+    Log a request (sampled, see LOGGER_SAMPLE_RATE).
+    """
+    if sampled(logger, LOGGER_SAMPLE_RATE, name, counters):
+        logger.debug("[%s] url=[%s]; headers=[%s]; data=[%s]",
+                    name, url, headers, LogBody(content))
+
+
+def token_expired(json_response, token_request):
+    """
+    Return True if a failed request has to be retried with a refreshed token.
+    """
+    return not token_request and int(json_response['code']) == INVALID_TOKEN
+
+
+def check_response(json_response, message):
+    """
+    Return the result of a json response, raising ValueError with the given
+    message if the request failed.
+    """
+    if json_response['success'] == False:
+        raise ValueError("%s (%s: %s)" % (message, json_response['code'], json_response['msg']))
+
+    return json_response['result']
+
+
+def parse_commands(codec, content):
+    """
+    Return the list of commands ({ code, value }) of a command body (None if
+    there is no body).
+    """
+    commands = codec.loads(content).get('commands') if content else None
+    if isinstance(commands, dict):
+        commands = [commands]
+
+    return commands
+
+
+def command_result(shadow, device_id, commands, json_response):
+    """
+    Check a command response, updating the device shadow with the commanded
+    values (write-through) or forgetting the device status on failure.
+    """
+    if json_response['success'] == False:
+        # Device state is unknown after a failed command
+        shadow.invalidate(device_id)
+    check_response(json_response, "Unable to send command")
+
+    if commands:
+        shadow.update(device_id, commands)
+
+    return True
+
+
+def device_status(device_id, status):
+    """
+    Return the status of a device from a get_devices_status result.
+    """
+    if device_id not in status:
+        raise ValueError("No status for device %s" % device_id)
+
+    return status[device_id]
+
+
+def status_result(shadow, device_id, json_response):
+    """
+    Return the status of a device status response (stored in the shadow).
+    """
+    result = check_response(json_response, "Unable to get device status")
+    shadow.update(device_id, result, polled=True)
+
+    return result
+
+
+def shadow_statuses(shadow, device_ids, refresh=False):
+    """
+    Return the statuses known by the shadow (dictionary by device id, empty if
+    refresh is set) and the list of other device ids (unique, in order).
+    """
+    device_ids = list(dict.fromkeys(str(device_id) for device_id in device_ids))
+
+    result = {}
+    if not refresh:
+        for device_id in device_ids:
+            status = shadow.status(device_id)
+            if status is not None:
+                result[device_id] = status
+
+    return result, [device_id for device_id in device_ids if device_id not in result]
+
+
+def batch_status_result(shadow, json_response, result):
+    """
+    Add the statuses of a multi-device status response to result (and to the
+    shadow).
+    """
+    for device in check_response(json_response, "Unable to get devices status") or []:
+        result[device['id']] = device['status']
+        shadow.update(device['id'], device['status'], polled=True)
+
+    return result
+
+
+def print_device_list(devices):
+    """
+    Print a list of devices (get_devices)
+    """
+    print("Devices list:")
+    for device_idx, device in enumerate(devices, 1):
+        print("\tDevice %d:" % (device_idx))
+        print(device)
+
+
+class TuyaCloud(object):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None,
+                pool_maxsize=POOL_MAXSIZE, token_refresh_margin=TOKEN_REFRESH_MARGIN,
+                json_codec=None, shadow_max_age=SHADOW_MAX_AGE, command_window=COMMAND_WINDOW):
+        """
+        Connect to Tuya Iot Cloud
+
+        Parameters:
+            client_region   : Region (cn|w-us|e-us|eu|w-eu|in)
+            client_id       : Client id (Cloud > "Project" > Authorization Ket > Access ID/Client ID)
+            client_secret   : Client id (Cloud > "Project" > Authorization Ket > Access Secret/Client Secret)
+            device_id       : Tuya device id (set by particular classes that inherit this class)
+            log_file        : Filename to be used for logging
+            pool_maxsize    : Maximum connections of the shared region transport
+                              (only used by the first client of a region)
+            token_refresh_margin
+                            : Seconds before expiry to refresh the shared token
+                              in background (None to disable)
+            json_codec      : JsonCodec used for responses and command bodies
+                              (default_codec() if None).
+            shadow_max_age  : Seconds a known device status is served locally
+                              (None to disable, only used by the first client
+                              of a region and client id)
+            command_window  : Seconds commands are merged before being sent
+                              (None to send each command at once, only used
+                              by the first client of a device)
+        """
+
+        self.logger = None
+        self.log_counters = {}
+        self.device_id = device_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.client_region = client_region
+        self.codec = json_codec if json_codec is not None else default_codec()
+
+        # Region validation
+        if self.client_region not in TUYA_ENDPOINTS:
+            raise ValueError("Invalid value for client region")
+
+        self.endpoint = TUYA_ENDPOINTS[self.client_region]
+        self.transport = get_transport(self.client_region, pool_maxsize)
+
+        # Configure logger (if given)
+        if log_file is not None:
+            self.logger = get_logger(log_file, __name__)
+
+        # Request signature
+        self.signer = TuyaSigner(self.client_id, self.client_secret)
+
+        # Get access token (shared with other clients of the same client id)
+        self.token = get_token_manager(self.client_region, self.client_id,
+                                        token_refresh_margin)
+        self.token.refresh(self.__request_access_token)
+
+        # Device status shadow (shared with other clients of the same client id)
+        self.shadow = get_shadow(self.client_region, self.client_id, shadow_max_age)
+
+        # Command pipeline (if enabled, shared with other clients of the device)
+        self.pipeline = None
+        if command_window is not None:
+            self.pipeline = get_pipeline(self.client_region, self.client_id, self.device_id,
+                lambda commands: self.__command(self.codec.dumps({ "commands" : commands }), commands),
+                command_window)
+
+
+    def __send(self, name, method, url, content=None, token_request=False):
+        """
+        Sign and send a request to Tuya IoT Cloud, returning the json response.
+
+        The shared access token is read once per attempt so signature and
+        headers always agree. If the token has expired, it is renewed once for
+        all clients sharing it and the request is retried.
+        """
+        REQUEST_URL = f'{self.endpoint}{url}'
+
+        for attempt in range(TOKEN_RETRIES + 1):
+            access_token = None if token_request else self.token.access_token
+            headers = self.signer.sign(method, url, content, access_token, token_request)
+
+            # Log
+            log_request(self.logger, self.log_counters, name, REQUEST_URL, headers, content)
+
+            # Send request
+            if method == "POST":
+                response = self.transport.post(REQUEST_URL, headers = headers, data = content)
+            else:
+                response = self.transport.get(REQUEST_URL, headers = headers)
 
-        # Log
-        if self.logger:
-            self.logger.debug("[%s] url=[%s]; headers=[%s]; data=[%s]" %
-                            (_NAME, COMMAND_URL, headers, content))
+            json_response = self.codec.loads(response.content, RESPONSE_KEYS)
+            if json_response['success'] == True:
+                break
 
-        # Send request
-        response = requests.post(COMMAND_URL, headers = headers, data = content)
-        json_response = json.loads(response.content)
-        if json_response['success'] == False:
             # Log
             if self.logger:
-                self.logger.error("[%s] response=[%s]" % (_NAME, json_response))
+                self.logger.error("[%s] response=[%s]", name, json_response)
 
             # If token has expired, refresh it
-            errcode = int(json_response['code'])
-            if errcode == INVALID_TOKEN:
-                self.refresh_access_token()
-                return self.command(content=content)
-            else:
-                raise ValueError("Unable to send command (%s: %s)" %
-                                (json_response['code'], json_response['msg']))
+            if not token_expired(json_response, token_request):
+                break
 
+            self.token.refresh(self.__request_access_token, access_token)
 
-    def refresh_access_token(self):
+        return json_response
+
+
+    def __request_access_token(self, refresh_token=None):
         """
-        Get Tuya IoT access token (a signature to verify the identity)
+        Request a new access token (called by the token manager).
         https://developer.tuya.com/en/docs/iot/new-singnature?id=Kbw0q34cs2e5g
+
+        When a refresh token is available, the refresh token grant
+        (GET /v1.0/token/{refresh_token}) is used and a new token is requested
+        only if that fails.
         """
         _NAME = self.refresh_access_token.__name__
-        _URL = "/v1.0/token?grant_type=1"
-        time_now = str(int(time.time() * 1000))
-        ACCESS_TOKEN_URL = f'{self.endpoint}{_URL}'
 
-        # Set area id and call id (used for signature calculation)
-        self.area_id = time_now
-        self.call_id = str(uuid.uuid4())
+        if refresh_token is not None:
+            json_response = self.__send(_NAME, "GET", token_url(refresh_token),
+                                        token_request=True)
+            if json_response['success'] == True:
+                return json_response['result']
 
-        # Create signature (use encryption for empty body)
-        signature_headers = {
-            "area_id" : self.area_id,
-            "call_id" : self.call_id
-        }
-        stringToSign = self.__create_string_to_sign(
-                                        method  = "GET",
-                                        content = None,
-                                        headers = signature_headers,
-                                        url     = _URL
-                                    )
-        signature = self.__create_signature(t=time_now,stringToSign=stringToSign,refresh_token=True)
+        json_response = self.__send(_NAME, "GET", token_url(), token_request=True)
 
-        # Create request headers
-        headers = self.__create_request_headers(signature, time_now)
+        return check_response(json_response, "Access token refresh error")
 
-        # Log
-        if self.logger:
-            self.logger.debug("[%s] url=[%s]; headers=[%s]" %
-                                (_NAME, ACCESS_TOKEN_URL, headers))
 
-        # Send request
-        response = requests.get(ACCESS_TOKEN_URL, headers = headers)
-        json_response = json.loads(response.content)
-        if json_response['success'] == False:
-            # Log
-            if self.logger:
-                self.logger.error("[%s] response=[%s]" % (_NAME, json_response))
+    @property
+    def access_token(self):
+        return self.token.access_token
 
-            raise ValueError("Access token refresh error (%s: %s)" %
-                                (json_response['code'], json_response['msg']))
 
-        # Get access token
-        self.access_token = json_response['result']['access_token']
+    def command(self, content=None):
+        """
+        Send a command to a Tuya device.
+        https://developer.tuya.com/en/docs/cloud/e2512fb901?id=Kag2yag3tiqn5
 
+        Commands setting values the device already has (device shadow) are not
+        sent. Return True if the command was sent.
 
-    def get_devices(self):
+        If a command window is set, the commands are merged with the ones
+        issued for the device (by any client) within the window and a Future
+        resolved with the result of the merged request is returned; request
+        errors are raised by Future.result().
         """
-        Get Tuya devices for current user.
+        commands = parse_commands(self.codec, content)
+
+        if self.pipeline is not None and commands:
+            return self.pipeline.submit(commands)
+
+        return self.__command(content, commands)
+
+
+    def __command(self, content, commands):
         """
-        _NAME = self.get_devices.__name__
-        _URL = "/v1.0/iot-01/associated-users/devices"
-        time_now = str(int(time.time() * 1000))
-        DEVICES_URL = f'{self.endpoint}{_URL}'
+        Send a command request (commands parsed from content, if any).
+        """
+        _NAME = self.command.__name__
 
-        # Create signature (use encryption for empty body)
-        signature_headers = {
-            "area_id" : self.area_id,
-            "call_id" : self.call_id
-        }
-        stringToSign = self.__create_string_to_sign(
-                                        method  = "GET",
-                                        content = None,
-                                        headers = signature_headers,
-                                        url     = _URL
-                                    )
+        if commands and self.shadow.is_noop(self.device_id, commands):
+            return False
 
-        signature = self.__create_signature(t=time_now, stringToSign=stringToSign)
+        json_response = self.__send(_NAME, "POST", command_url(self.device_id), content)
 
-        # Create request headers
-        headers = self.__create_request_headers(signature, time_now)
+        return command_result(self.shadow, self.device_id, commands, json_response)
 
-        # Log
-        if self.logger:
-            self.logger.debug("[%s] url=[%s]; headers=[%s]" %
-                                (_NAME, DEVICES_URL, headers))
 
-        # Send request
-        response = requests.get(DEVICES_URL, headers = headers)
-        json_response = json.loads(response.content)
-        if json_response['success'] == False:
-            # Log
-            if self.logger:
-                self.logger.error("[%s] response=[%s]" % (_NAME, json_response))
+    def refresh_access_token(self):
+        """
+        Get Tuya IoT access token (a signature to verify the identity)
+        https://developer.tuya.com/en/docs/iot/new-singnature?id=Kbw0q34cs2e5g
+
+        The token is shared by all clients with the same region and client id,
+        so concurrent refreshes result in a single token request.
+        """
+        self.token.refresh(self.__request_access_token, self.token.access_token)
 
-            # If token has expired, refresh it
-            errcode = int(json_response['code'])
-            if errcode == INVALID_TOKEN:
-                self.refresh_access_token()
-                return self.get_devices()
-            else:
-                raise ValueError("Unable to get devices list (%s: %s)" %
-                                (json_response['code'], json_response['msg']))
 
-        return json_response['result']['devices']
+    def get_devices(self):
+        """
+        Get Tuya devices for current user.
+        """
+        _NAME = self.get_devices.__name__
+
+        json_response = self.__send(_NAME, "GET", DEVICES_URL)
 
+        return check_response(json_response, "Unable to get devices list")['devices']
 
-    def get_device_status(self):
+
+    def get_device_status(self, status=None):
         """
         Get single device status.
         https://developer.tuya.com/en/docs/cloud/f76865b055?id=Kag2ycn1lvwpt
+
+        Parameters:
+            status      : Result of get_devices_status to read the device
+                          status from (no request is sent).
         """
         _NAME = self.get_device_status.__name__
-        _URL = f'/v1.0/iot-03/devices/{self.device_id}/status'
-        time_now = str(int(time.time() * 1000))
-        DEVICE_STATUS_URL = f'{self.endpoint}{_URL}'
 
-        # Create signature (use encryption for empty body)
-        signature_headers = {
-            "area_id" : self.area_id,
-            "call_id" : self.call_id
-        }
-        stringToSign = self.__create_string_to_sign(
-                                        method  = "GET",
-                                        content = None,
-                                        headers = signature_headers,
-                                        url     = _URL
-                                    )
+        if status is not None:
+            return device_status(self.device_id, status)
 
-        signature = self.__create_signature(t=time_now, stringToSign=stringToSign)
+        shadow_status = self.shadow.status(self.device_id)
+        if shadow_status is not None:
+            return shadow_status
 
-        # Create request headers
-        headers = self.__create_request_headers(signature, time_now)
+        json_response = self.__send(_NAME, "GET", status_url(self.device_id))
 
-        # Log
-        if self.logger:
-            self.logger.debug("[%s] url=[%s]; headers=[%s]" %
-                                (_NAME, DEVICE_STATUS_URL, headers))
+        return status_result(self.shadow, self.device_id, json_response)
 
-        # Send request
-        response = requests.get(DEVICE_STATUS_URL, headers = headers)
-        json_response = json.loads(response.content)
-        if json_response['success'] == False:
-            # Log
-            if self.logger:
-                self.logger.debug("[%s] response=[%s]" % (_NAME, json_response))
 
-            # If token has expired, refresh it
-            errcode = int(json_response['code'])
-            if errcode == INVALID_TOKEN:
-                self.refresh_access_token()
-                return self.get_device_status()
-            else:
-                raise ValueError("Unable to get device status (%s: %s)" %
-                                (json_response['code'], json_response['msg']))
+    def get_devices_status(self, device_ids=None, refresh=False):
+        """
+        Get the status of multiple devices, BATCH_STATUS_SIZE devices per
+        request. Devices with a status known within the staleness bound are
+        read from the device shadow.
+
+        Parameters:
+            device_ids  : List of device ids (default the device of this
+                          object).
+            refresh     : Request the status of all devices (ignore shadow).
+
+        Return a dictionary with device id as key and device status (as
+        returned by get_device_status) as value.
+
+        Ex:
+            status = obj.get_devices_status([switch.device_id, thermostat.device_id])
+            switch.get_status(['switch_1'], status)
+        """
+        _NAME = self.get_devices_status.__name__
+
+        if device_ids is None:
+            device_ids = [self.device_id]
+
+        result, device_ids = shadow_statuses(self.shadow, device_ids, refresh)
+        for url in batch_status_urls(device_ids):
+            batch_status_result(self.shadow, self.__send(_NAME, "GET", url), result)
 
-        return json_response['result']
+        return result
 
 
     def print_devices(self):
         """
         Print all devices for current user (get_devices)
         """
-        device_idx = 1
-        json_devices = self.get_devices()
+        print_device_list(self.get_devices())
 
-        print("Devices list:")
-        for device in json_devices:
-            print("\tDevice %d:" % (device_idx))
-            print(device)
-            device_idx += 1
 
+    def transport_stats(self):
+        """
+        Return connection reuse statistics of the shared region transport.
+        """
+        return self.transport.stats()
@@ -24,13 +24,30 @@ Class has the following methods:
         vale (action) in the switch_dict input parameter.
 
     4) get_status
-        Get switch device status.
+        Get switch device status (optionally from a shared get_devices_status
+        result).
+
+Commands return the result of TuyaCloud.command (a Future if the object was
+created with a command window).
 """
 
+def switch_body(switch_dict):
+    """
+    Return the command body setting each switch (name as key) to its action
+    (True/False as value), shared with AsyncTuyaSwitch.
+    """
+    return {'commands':[{'code': key, 'value': value} for key,value in switch_dict.items()]}
+
+def switch_status(device_status, switch_list):
+    """
+    Return the status of the switches in switch_list from a device status.
+    """
+    return { d['code'] : d['value'] for d in device_status if d['code'] in switch_list }
+
 class TuyaSwitch(TuyaCloud):
-    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None, **kwargs):
         # Call constructor for TuyaCloud (to ensure API communication)
-        super().__init__(client_region, client_id, client_secret, device_id, log_file)
+        super().__init__(client_region, client_id, client_secret, device_id, log_file, **kwargs)
 
     def turn_on(self, switch_list=None):
         """
@@ -47,8 +64,8 @@ class TuyaSwitch(TuyaCloud):
             return
 
         # Create request body
-        switch_body = {'commands':[{'code': key, 'value': True} for key in switch_list]}
-        super().command(content=json.dumps(switch_body))
+        body = switch_body(dict.fromkeys(switch_list, True))
+        return super().command(content=self.codec.dumps(body))
 
     def turn_off(self, switch_list=None):
         """
@@ -65,8 +82,8 @@ class TuyaSwitch(TuyaCloud):
             return
 
         # Create request body
-        switch_body = {'commands':[{'code': key, 'value': False} for key in switch_list]}
-        super().command(content=json.dumps(switch_body))
+        body = switch_body(dict.fromkeys(switch_list, False))
+        return super().command(content=self.codec.dumps(body))
 
     def turn_custom(self, switch_dict=None):
         """
@@ -81,15 +98,17 @@ class TuyaSwitch(TuyaCloud):
             return
 
         # Create request body
-        switch_body = {'commands':[{'code': key, 'value': value} for key,value in switch_dict.items()]}
-        super().command(content=json.dumps(switch_body))
+        body = switch_body(switch_dict)
+        return super().command(content=self.codec.dumps(body))
 
-    def get_status(self, switch_list=None):
+    def get_status(self, switch_list=None, status=None):
         """
         Get status of switch(es).
 
         Parameters:
             switch_list  : List with switches names to get status.
+            status       : Result of get_devices_status to read from (no
+                           request is sent).
 
         Ex:
             obj.get_status(['switch_1','switch_2'])
@@ -98,12 +117,6 @@ class TuyaSwitch(TuyaCloud):
             return
 
         # Get status
-        device_status_dict = super().get_device_status()
-
-        # Create return
-        result_status = {}
-        for d in device_status_dict:
-            if d['code'] in switch_list:
-                result_status[d['code']] = d['value']
+        device_status_dict = super().get_device_status(status)
 
-        return result_status
+        return switch_status(device_status_dict, switch_list)
@@ -4,6 +4,7 @@ import hmac
 import hashlib
 import requests
 from TuyaCloud import TuyaCloud
+from concurrent.futures import Future
 
 """
 TuyaThermostat is designed to control temperature for thermostats compatible
@@ -37,12 +38,47 @@ Class has the following methods:
 
     9) set_trigger_temperature
         Set trigger temperature.
+
+Status getters optionally read from a shared get_devices_status result.
 """
 
+def thermostat_body(code, value):
+    """
+    Return the command body setting a thermostat code, shared with
+    AsyncTuyaThermostat.
+    """
+    return {'commands':{'code': code, 'value': value}}
+
+def thermostat_status(device_status):
+    """
+    Return a device status as a dictionary with code as key.
+    """
+    return { d['code'] : d['value'] for d in device_status }
+
 class TuyaThermostat(TuyaCloud):
-    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None):
+    def __init__(self, client_region=None, client_id=None, client_secret=None, device_id=None, log_file=None, **kwargs):
         # Call constructor for TuyaCloud (to ensure API communication)
-        super().__init__(client_region, client_id, client_secret, device_id, log_file)
+        super().__init__(client_region, client_id, client_secret, device_id, log_file, **kwargs)
+
+    def __command(self, body):
+        """
+        Send a command body, printing request errors (when the command is
+        merged in a command window, once the merged request completes).
+        """
+        try:
+            result = super().command(content=self.codec.dumps(body))
+        except ValueError as e:
+            print(f'Error: {e}')
+            return
+
+        if isinstance(result, Future):
+            result.add_done_callback(self.__print_error)
+
+        return result
+
+    def __print_error(self, future):
+        if future.exception() is not None:
+            print(f'Error: {future.exception()}')
 
     def turn_on(self):
         """
@@ -53,12 +89,8 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'switch', 'value': True}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('switch', True)
+        return self.__command(body)
 
     def turn_off(self):
         """
@@ -69,12 +101,8 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'switch', 'value': False}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('switch', False)
+        return self.__command(body)
 
     def window_check_on(self):
         """
@@ -85,12 +113,8 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'window_check', 'value': True}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('window_check', True)
+        return self.__command(body)
 
     def window_check_off(self):
         """
@@ -101,12 +125,8 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'window_check', 'value': False}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('window_check', False)
+        return self.__command(body)
 
     def frost_on(self):
         """
@@ -117,12 +137,8 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'frost', 'value': True}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('frost', True)
+        return self.__command(body)
 
     def frost_off(self):
         """
@@ -133,14 +149,10 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'frost', 'value': False}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('frost', False)
+        return self.__command(body)
 
-    def get_room_temperature(self):
+    def get_room_temperature(self, status=None):
         """
         Get room temperature.
 
@@ -149,12 +161,12 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Get status
-        status = self.get_status()
+        status = self.get_status(status)
 
         # Parse 'temp_current'
         return status.get('temp_current', -1)
 
-    def get_trigger_temperature(self):
+    def get_trigger_temperature(self, status=None):
         """
         Get trigger temperature.
 
@@ -163,7 +175,7 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Get status
-        status = self.get_status()
+        status = self.get_status(status)
 
         # Parse 'temp_set'
         return status.get('temp_set', -1)
@@ -177,27 +189,22 @@ class TuyaThermostat(TuyaCloud):
         """
 
         # Create request body
-        body = {'commands':{'code': 'temp_set', 'value': temp}}
-        try:
-            super().command(content=json.dumps(body))
-        except ValueError as e:
-            print(f'Error: {e}')
-            return
+        body = thermostat_body('temp_set', temp)
+        return self.__command(body)
 
-    def get_status(self):
+    def get_status(self, status=None):
         """
         Get status of switch(es).
 
+        Parameters:
+            status      : Result of get_devices_status to read from (no request
+                          is sent).
+
         Ex:
             obj.get_status()
         """
 
         # Get status
-        device_status_dict = super().get_device_status()
-
-        # Create return
-        result_status = {}
-        for d in device_status_dict:
-            result_status[d['code']] = d['value']
+        device_status_dict = super().get_device_status(status)
 
-        return result_status
+        return thermostat_status(device_status_dict)
@@ -0,0 +1,62 @@
+import sys
+import json
+import asyncio
+sys.path.append('../TuyaCloud')
+
+import aiohttp
+from AsyncTuyaSwitch import AsyncTuyaSwitch
+
+# Offline: requests are answered locally (the aiohttp sessions are real)
+SESSIONS = []
+
+class Response(object):
+    def __init__(self, body):
+        self.body = json.dumps(body).encode()
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def read(self):
+        return self.body
+
+def request(session, method, url, **kwargs):
+    if session not in SESSIONS:
+        SESSIONS.append(session)
+    if '/token' in url:
+        return Response({ "success" : True, "result" : { "access_token" : "TOKEN", "expire_time" : 7200 } })
+    if url.endswith('/status'):
+        return Response({ "success" : True, "result" : [{ "code" : "switch_1", "value" : True }] })
+    return Response({ "success" : True, "result" : True })
+
+aiohttp.ClientSession.request = request
+
+# Clients created once, used from two event loops
+objs = [AsyncTuyaSwitch('eu', 'client_id', 'client_secret', 'device_%d' % i, shadow_max_age=None)
+            for i in range(10)]
+
+async def poll():
+    # Concurrent token renewals contend on the token lock
+    await asyncio.gather(*[obj.refresh_access_token() for obj in objs])
+    return await asyncio.gather(*[obj.get_status(['switch_1']) for obj in objs])
+
+# Run twice, each asyncio.run has its own event loop
+print("First event loop...")
+print(asyncio.run(poll())[0])
+print("Second event loop...")
+print(asyncio.run(poll())[0])
+
+# The session of the first loop was closed when the second loop replaced it
+print("Sessions: %d, closed: %d" % (len(SESSIONS), sum(session.closed for session in SESSIONS)))
+assert len(SESSIONS) == 2
+assert SESSIONS[0].closed and not SESSIONS[1].closed
+
+async def close():
+    for obj in objs:
+        await obj.close()
+
+asyncio.run(close())
+assert SESSIONS[1].closed
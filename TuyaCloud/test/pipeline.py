@@ -0,0 +1,77 @@
+import sys
+import json
+import threading
+sys.path.append('../TuyaCloud')
+
+import TuyaCloud as tuya_module
+from TuyaCloud import TuyaCommandPipeline
+from TuyaSwitch import TuyaSwitch
+
+# Offline: requests are answered locally by the region transport (no Tuya IoT
+# access needed)
+class Response(object):
+    def __init__(self, body):
+        self.content = json.dumps(body).encode()
+
+
+class Transport(object):
+    def __init__(self):
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None):
+        return Response({ "success" : True, "result" : { "access_token" : "TOKEN", "expire_time" : 7200 } })
+
+    def post(self, url, headers=None, data=None):
+        device_id = url.split('/')[-2]
+        with self.lock:
+            self.commands.append((device_id, json.loads(data)['commands']))
+        if device_id == 'offline':
+            return Response({ "success" : False, "code" : 2001, "msg" : "device is offline" })
+        return Response({ "success" : True, "result" : True })
+
+transport = Transport()
+tuya_module._transports['eu'] = transport
+
+WINDOW = 0.2
+
+def switch(device_id):
+    return TuyaSwitch('eu', 'client_id', 'client_secret', device_id,
+                        shadow_max_age=None, command_window=WINDOW)
+
+# Commands of the switches of a device issued within the window are merged in
+# one request per device (last value wins, first issue order)
+a, b, other = switch('multi'), switch('multi'), switch('other')
+futures = [a.turn_on(['switch_1']), b.turn_on(['switch_2']), a.turn_off(['switch_1']),
+            other.turn_on(['switch_1'])]
+assert transport.commands == []
+print([future.result(5) for future in futures])
+print(transport.commands)
+assert all(future.result() for future in futures)
+assert sorted(transport.commands) == [
+    ('multi', [{ "code" : "switch_1", "value" : False }, { "code" : "switch_2", "value" : True }]),
+    ('other', [{ "code" : "switch_1", "value" : True }])]
+
+# A new window starts after the merged request
+del transport.commands[:]
+a.turn_custom({ 'switch_3' : True }).result(5)
+assert transport.commands == [('multi', [{ "code" : "switch_3", "value" : True }])]
+
+# Request errors are raised by every future of the merged request
+offline = [switch('offline'), switch('offline')]
+futures = [offline[0].turn_on(['switch_1']), offline[1].turn_on(['switch_2'])]
+for future in futures:
+    try:
+        future.result(5)
+        assert False
+    except ValueError as e:
+        print(e)
+
+# Pipelines can be flushed before the window ends
+sent = []
+obj = TuyaCommandPipeline(lambda commands: sent.append(commands) or len(sent), 60)
+future = obj.submit([{ "code" : "switch_1", "value" : True }])
+obj.flush()
+assert future.result(0) == 1 and sent == [[{ "code" : "switch_1", "value" : True }]]
+obj.flush()
+assert len(sent) == 1
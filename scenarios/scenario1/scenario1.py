@@ -11,6 +11,9 @@ sys.path.append('../../HuaweiFusionSolar')
 
 from TuyaSwitch import TuyaSwitch
 from HuaweiInverter import HuaweiInverter
+from AdaptivePoller import AdaptivePoller
+from PowerNowcaster import PowerNowcaster
+from KpiRollup import KpiRollup
 from notification import Notification
 
 """
@@ -35,10 +38,18 @@ tuya_obj = None
 #
 inverter_obj = None
 #
+poller_obj = None
+#
+nowcaster_obj = None
+#
+rollup_obj = None
+#
 notification_obj = None
 #
 TASK_SLEEP_TIME = 300
 #
+NOWCAST_HORIZON = 150   # Decide on the power expected half a refresh ahead
+#
 TUYA_LOG_FILE="tuya.log"
 #
 HUAWEI_LOG_FILE="huawei.log"
@@ -50,6 +61,9 @@ def application_init(file):
     global app_data
     global tuya_obj
     global inverter_obj
+    global poller_obj
+    global nowcaster_obj
+    global rollup_obj
     global notification_obj
 
     print()
@@ -63,6 +77,8 @@ def application_init(file):
         'app_state' : False,
         'app_config_trigger_value' : None,
         'app_status_active_power' : None,
+        'app_status_expected_power' : None,
+        'app_status_daily_energy' : None,
         'app_status_switch_state' : None,
         'app_status_datetime' : None,
     }
@@ -94,21 +110,49 @@ def application_init(file):
                     )
         #
         #######################################################
-        # Initialize huawei inverter object
+        # Initialize huawei inverter object (daily energy is
+        # rolled up from the samples it reads)
         #######################################################
         print()
         print("Initialize huawei...")
         print()
+        rollup_obj = KpiRollup()
         inverter_obj = HuaweiInverter(
                         client_name     = data['app_huawei_client_name'],
                         client_pass     = data['app_huawei_client_pass'],
                         client_domain   = data['app_huawei_client_domain'],
                         device_type     = data['app_huawei_device_type'],
                         device_id       = data['app_huawei_device_id'],
-                        log_file        = HUAWEI_LOG_FILE
+                        log_file        = HUAWEI_LOG_FILE,
+                        rollup          = rollup_obj
                         )
         #
         #######################################################
+        # Initialize adaptive poller (plant coordinates from
+        # input file or inverter topology). Falls back to a
+        # fixed TASK_SLEEP_TIME if coordinates are unknown.
+        #######################################################
+        print()
+        print("Initialize poller...")
+        print()
+        try:
+            if 'app_huawei_latitude' in data and 'app_huawei_longitude' in data:
+                poller_obj = AdaptivePoller(
+                                latitude    = data['app_huawei_latitude'],
+                                longitude   = data['app_huawei_longitude']
+                                )
+            else:
+                poller_obj = AdaptivePoller.from_inverter(inverter_obj)
+        except Exception as e:
+            print("Adaptive poller disabled: %s" % str(e))
+            poller_obj = None
+        #
+        #######################################################
+        # Initialize active power nowcaster
+        #######################################################
+        nowcaster_obj = PowerNowcaster()
+        #
+        #######################################################
         # Initialize notification object
         #######################################################
         print()
@@ -135,13 +179,36 @@ def application_init(file):
     print()
 
 
+def task_sleep_time(active_power=None, trigger_power=None):
+    #######################################################
+    # Time until the next inverter read: skip nights, poll
+    # every SmartPVMS refresh near the trigger value and
+    # less often far from it.
+    #######################################################
+    if poller_obj is None:
+        return TASK_SLEEP_TIME
+
+    return poller_obj.delay(active_power, trigger_power)
+
+
 def application_task():
     global app_data
     global app_lock
     global tuya_obj
     global inverter_obj
+    global poller_obj
+    global nowcaster_obj
+    global rollup_obj
     global notification_obj
 
+    #######################################################
+    # Seed the nowcaster with today's inverter history.
+    #######################################################
+    try:
+        nowcaster_obj.seed_from_inverter(inverter_obj)
+    except Exception as e:
+        print("Seed nowcaster error: %s" % str(e))
+
     while not stop_event.is_set():
         #######################################################
         # With lock acquired, read inverter real time active
@@ -189,17 +256,36 @@ def application_task():
             continue
 
         #
-        #
+        # Expected active power until the next SmartPVMS refresh
         #
         active_power = float(app_data['app_status_active_power'])
         trigger_power = float(app_data['app_config_trigger_value'])
+        nowcaster_obj.update(active_power)
+        expected_power = nowcaster_obj.nowcast(time.time() + NOWCAST_HORIZON)[0]
+        app_data['app_status_expected_power'] = expected_power
+        app_data['app_status_daily_energy'] = inverter_obj.daily_energy()
         print("active power: %f" % active_power)
+        print("expected power: %f" % expected_power)
         print("trigger power: %f" % trigger_power)
 
+        #
+        # Cross-check the daily energy with SmartPVMS (at most
+        # once a week)
+        #
+        try:
+            deviations = rollup_obj.cross_check(inverter_obj, inverter_obj.device_type,
+                                                int(time.time() * 1000),
+                                                devIds=[inverter_obj.device_id])
+            for (device_id, day), (local, server) in (deviations or {}).items():
+                print("daily energy %s: %f (SmartPVMS: %f)" % (
+                        datetime.fromtimestamp(day / 1000).strftime("%d/%m/%Y"), local, server))
+        except Exception as e:
+            print("Cross-check daily energy error: %s" % str(e))
+
         #
         # Update switch state
         #
-        if active_power >= trigger_power:
+        if expected_power >= trigger_power:
             #
             # Turn on switch
             #
@@ -244,7 +330,7 @@ def application_task():
         #######################################################
         # Thread sleep.
         #######################################################
-        stop_event.wait(TASK_SLEEP_TIME)
+        stop_event.wait(task_sleep_time(active_power, trigger_power))
 
 
 # Lock is acquired when function is called
@@ -304,6 +390,8 @@ def application_stop():
     app_data['app_state'] = False
     app_data['app_config_trigger_value'] = None
     app_data['app_status_active_power'] = None
+    app_data['app_status_expected_power'] = None
+    app_data['app_status_daily_energy'] = None
     app_data['app_status_switch_state'] = None
     app_data['app_status_datetime'] = None
 
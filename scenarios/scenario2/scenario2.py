@@ -29,6 +29,8 @@ living_obj = None
 #
 TASK_SLEEP_TIME = 300
 #
+COMMAND_WINDOW = 0.3    # Merge light commands issued within 300 ms
+#
 TUYA_LOG_FILE="tuya.log"
 #
 lights = ["living", "bucatarie", "hol", "baie1", "baie2"]
@@ -71,7 +73,8 @@ def application_init(file):
                                 client_id       = data['app_tuya_client_id'],
                                 client_secret   = data['app_tuya_client_secret'],
                                 device_id       = light_device_id,
-                                log_file        = TUYA_LOG_FILE
+                                log_file        = TUYA_LOG_FILE,
+                                command_window  = COMMAND_WINDOW
                             )
 
             app_data[light] = {"object" : obj, "switch_name" : light_switch_name}
@@ -138,12 +141,13 @@ def set_button():
     tuya_obj = app_data[name]['object']
     switch_name = app_data[name]['switch_name']
     #
-    # Handle action
+    # Handle action (commands for lights on the same device issued within
+    # COMMAND_WINDOW are merged, wait for the merged request to complete)
     #
     if state == "on":
-        tuya_obj.turn_on([switch_name])
+        tuya_obj.turn_on([switch_name]).result()
     else:
-        tuya_obj.turn_off([switch_name])
+        tuya_obj.turn_off([switch_name]).result()
 
     return "Success"
 
@@ -154,18 +158,23 @@ def get_button():
 
     result = {}
     #
+    # Read all devices status at once
+    #
+    device_ids = [value['object'].device_id for value in app_data.values()]
+    status = thermostat.get_devices_status(device_ids + [thermostat.device_id])
+    #
     #
     #
     for key, value in app_data.items():
         tuya_obj = value['object']
         switch_name = value['switch_name']
-        state = tuya_obj.get_status(switch_name)[switch_name]
+        state = tuya_obj.get_status(switch_name, status)[switch_name]
         result[key] = state
     #
     #
     #
-    result["set_temp"] = thermostat.get_trigger_temperature()
-    result["room_temp"] = thermostat.get_room_temperature()
+    result["set_temp"] = thermostat.get_trigger_temperature(status)
+    result["room_temp"] = thermostat.get_room_temperature(status)
     #
     #
     #